@@ -0,0 +1,527 @@
+import os
+import hashlib
+import numpy as np
+import scipy.signal
+import soundfile as sf
+import soxr
+import librosa
+from beat_tracking import track_beats
+from settings import (ANALYSIS_BANDS, ANALYSIS_CACHE_DIR, ANALYSIS_PROFILE, BEAT_TRACKER, STREAM_ANALYSIS,
+                      STREAM_ANALYSIS_MIN_DURATION, TRACK_BPM)
+
+# Bump this whenever the analysis code changes so old cache entries are ignored
+ANALYSIS_CACHE_VERSION = 3
+
+# Arrays stored in the .npz sidecar
+ANALYSIS_KEYS = ["beat_times", "tempo", "rms", "rms_times", "spectral_centroid", "spectral_times",
+                 "onset_env", "band_energy", "duration"]
+
+# Analysis profiles. "precise" is the original librosa setup; "fast" decodes at
+# half the rate with the same ~93 ms window and a 46 ms hop, which is still finer
+# than the 24 fps video grid (see `python benchmark.py profiles` for the drift).
+ANALYSIS_PROFILES = {
+    "precise": {"sr": 22050, "frame_length": 2048, "hop_length": 512},
+    "fast": {"sr": 11025, "frame_length": 1024, "hop_length": 512},
+}
+
+
+def get_analysis_profile(name=None):
+    # Analysis parameters (sr, frame_length, hop_length) for a profile name
+    name = name or ANALYSIS_PROFILE
+    if name not in ANALYSIS_PROFILES:
+        raise ValueError(f"Unknown analysis profile {name!r} (choose from {', '.join(ANALYSIS_PROFILES)})")
+    return dict(ANALYSIS_PROFILES[name])
+
+
+def track_hash(track_path, chunk_size=1 << 20):
+    # Hash the file contents (not the name or mtime) so renamed/touched files still hit the cache
+    digest = hashlib.sha256()
+    with open(track_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def analysis_cache_key(track_path, sr=22050, frame_length=2048, hop_length=512, mode="full"):
+    # Any change to the audio or to the analysis parameters gives a new key,
+    # so stale entries are never read back
+    params = (f"v{ANALYSIS_CACHE_VERSION}:sr={sr}:frame_length={frame_length}:hop_length={hop_length}"
+              f":bands={ANALYSIS_BANDS}")
+    if BEAT_TRACKER != "librosa" or TRACK_BPM:
+        params += f":beats={BEAT_TRACKER}:bpm={TRACK_BPM}"
+    if mode != "full":
+        params += f":mode={mode}"
+    return hashlib.sha256(f"{track_hash(track_path)}:{params}".encode()).hexdigest()[:32]
+
+
+def _cache_paths(cache_dir, key):
+    return (os.path.join(cache_dir, f"{key}.npz"),
+            os.path.join(cache_dir, f"{key}.pcm.npy"))
+
+
+def _write_atomic(path, save_func):
+    # Write to a temp file first so an interrupted run never leaves a half-written entry
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        save_func(f)
+    os.replace(tmp_path, path)
+
+
+def band_starts(n_bins, n_bands):
+    # First FFT bin of each log-spaced band (DC is skipped). Low bands are widened
+    # to at least one bin so none of them comes out empty.
+    starts = np.round(np.geomspace(1, n_bins, n_bands + 1)[:-1]).astype(int)
+    for i in range(1, n_bands):
+        starts[i] = max(starts[i], starts[i - 1] + 1)
+    return np.minimum(starts, n_bins - 1)
+
+
+class SpectralFeatureExtractor:
+    # Derives the spectral analysis features from a single magnitude spectrogram:
+    # spectral centroid, the log-mel spectrogram behind the onset envelope (and so
+    # beat tracking) and per-band energies. Replaces spectral_centroid and
+    # beat_track each running their own STFT. RMS stays on the time-domain frames:
+    # it needs no FFT, and the spectrogram form is Hann-weighted, which visibly
+    # changes the energy curve the effects are tuned to.
+
+    def __init__(self, sr, frame_length=2048, hop_length=512, n_mels=128, n_bands=ANALYSIS_BANDS, top_db=80.0):
+        self.sr = sr
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        self.top_db = top_db
+        self.freqs = librosa.fft_frequencies(sr=sr, n_fft=frame_length)
+        self.mel_basis = librosa.filters.mel(sr=sr, n_fft=frame_length, n_mels=n_mels)
+        self.band_starts = band_starts(len(self.freqs), n_bands)
+
+    def spectrogram(self, y):
+        # Same framing as the librosa feature functions (centred, constant padding)
+        return np.abs(librosa.stft(y, n_fft=self.frame_length, hop_length=self.hop_length,
+                                   center=True, pad_mode="constant"))
+
+    def from_spectrogram(self, S):
+        # Per-frame features from a (bins, frames) magnitude spectrogram. "mel_db"
+        # is not yet clipped to top_db, so callers can pick the reference maximum.
+        power = S ** 2
+        return {
+            "spectral_centroid": librosa.feature.spectral_centroid(S=S, freq=self.freqs)[0],
+            "band_energy": np.add.reduceat(power, self.band_starts, axis=0).astype(np.float32),
+            "mel_db": librosa.power_to_db(self.mel_basis @ power, top_db=None),
+        }
+
+    def onset_strength(self, mel_db):
+        # Median onset envelope, as librosa.beat.beat_track computes it from y
+        return librosa.onset.onset_strength(S=mel_db, sr=self.sr, n_fft=self.frame_length,
+                                            hop_length=self.hop_length, aggregate=np.median)
+
+    def extract(self, y, block_frames=2048):
+        # Works through the track a block of frames at a time, so only one block of
+        # the spectrogram (and of the framed samples behind RMS) is in memory. Every
+        # feature is per frame, so the blocks give the same values as one pass.
+        hop_length = self.hop_length
+        padded = np.pad(y, self.frame_length // 2)  # centred framing, as spectrogram() and librosa's rms
+        n_frames = 1 + (len(padded) - self.frame_length) // hop_length
+        parts = {"spectral_centroid": [], "band_energy": [], "mel_db": [], "rms": []}
+        for start in range(0, n_frames, block_frames):
+            stop = min(start + block_frames, n_frames)
+            block = padded[start * hop_length:(stop - 1) * hop_length + self.frame_length]
+            S = np.abs(librosa.stft(block, n_fft=self.frame_length, hop_length=hop_length, center=False))
+            for name, values in self.from_spectrogram(S).items():
+                parts[name].append(values)
+            parts["rms"].append(librosa.feature.rms(y=block, frame_length=self.frame_length,
+                                                    hop_length=hop_length, center=False)[0])
+        features = {name: np.concatenate(values, axis=-1) for name, values in parts.items()}
+        mel_db = features.pop("mel_db")
+        features["onset_env"] = self.onset_strength(np.maximum(mel_db, mel_db.max() - self.top_db))
+        return features
+
+
+def compute_analysis(y, sr, frame_length=2048, hop_length=512):
+    # One STFT pass for all features
+    extractor = SpectralFeatureExtractor(sr, frame_length=frame_length, hop_length=hop_length)
+    features = extractor.extract(y)
+
+    # Beats and tempo from the shared onset envelope
+    tempo, beat_times = track_beats(features["onset_env"], sr, hop_length, method=BEAT_TRACKER, bpm=TRACK_BPM)
+    times = librosa.times_like(features["rms"], sr=sr, hop_length=hop_length)
+
+    return {
+        "beat_times": beat_times,
+        "tempo": tempo,
+        "rms": features["rms"],
+        "rms_times": times,
+        "spectral_centroid": features["spectral_centroid"],
+        "spectral_times": times,
+        "onset_env": features["onset_env"],
+        "band_energy": features["band_energy"],
+        "duration": len(y) / sr,
+    }
+
+
+def read_cached_analysis(track_path, sr=22050, frame_length=2048, hop_length=512, cache_dir=None, mode="full",
+                         key=None):
+    # Returns the cached analysis dict (with memory-mapped samples "y"), or None on a miss.
+    # Pass the key from analysis_cache_key when the caller also writes the entry on a
+    # miss, so the track is only hashed once.
+    cache_dir = cache_dir or ANALYSIS_CACHE_DIR
+    key = key or analysis_cache_key(track_path, sr=sr, frame_length=frame_length, hop_length=hop_length, mode=mode)
+    features_path, pcm_path = _cache_paths(cache_dir, key)
+    if not (os.path.exists(features_path) and os.path.exists(pcm_path)):
+        return None
+
+    try:
+        with np.load(features_path) as data:
+            analysis = {name: data[name] for name in ANALYSIS_KEYS}
+        analysis["tempo"] = float(analysis["tempo"])
+        analysis["duration"] = float(analysis["duration"])
+        analysis["y"] = np.load(pcm_path, mmap_mode="r")
+        analysis["sr"] = sr
+        print(f"Loaded cached analysis for {track_path} ({key})")
+        return analysis
+    except Exception as e:
+        print(f"Ignoring unreadable analysis cache entry {key}: {e}")
+        return None
+
+
+def analyze_samples(track_path, y, sr, frame_length=2048, hop_length=512, cache_dir=None, key=None):
+    # Analyse already-decoded mono samples and store the result in the cache
+    cache_dir = cache_dir or ANALYSIS_CACHE_DIR
+    key = key or analysis_cache_key(track_path, sr=sr, frame_length=frame_length, hop_length=hop_length)
+    features_path, pcm_path = _cache_paths(cache_dir, key)
+    analysis = compute_analysis(y, sr, frame_length=frame_length, hop_length=hop_length)
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        _write_atomic(pcm_path, lambda f: np.save(f, y))
+        _write_atomic(features_path, lambda f: np.savez(f, **analysis))
+        # Samples memory-mapped from the cache, as on a warm run, so the decoded
+        # buffer can be freed once the caller drops it
+        y = np.load(pcm_path, mmap_mode="r")
+    except OSError as e:
+        print(f"Could not write analysis cache: {e}")
+
+    analysis["y"] = y
+    analysis["sr"] = sr
+    return analysis
+
+
+def should_stream(track_path):
+    # Decide whether to use block-streaming analysis for this track (see STREAM_ANALYSIS)
+    if STREAM_ANALYSIS == "0":
+        return False
+    try:
+        info = sf.info(track_path)
+    except Exception:
+        # Only formats libsndfile can read are streamed; everything else uses librosa.load
+        return False
+    return STREAM_ANALYSIS == "1" or info.duration >= STREAM_ANALYSIS_MIN_DURATION
+
+
+def resampled_length(track_path, sr):
+    # Length of the track at `sr`, as librosa.resample would produce it
+    info = sf.info(track_path)
+    return int(np.ceil(info.frames * sr / info.samplerate))
+
+
+def mono_blocks(track_path, sr, block_duration=30.0):
+    # Yields the track as float32 mono blocks at `sr`: each block of the source is
+    # mixed down and fed through a streaming soxr resampler, so no more than one
+    # block is ever decoded at a time. The blocks add up to resampled_length
+    # samples (padded with silence if the resampler comes up short).
+    info = sf.info(track_path)
+    native_sr = info.samplerate
+    n_out = resampled_length(track_path, sr)
+    resampler = soxr.ResampleStream(native_sr, sr, 1, dtype="float32", quality="HQ") if native_sr != sr else None
+    block_size = max(1, int(block_duration * native_sr))
+    written = 0
+    with sf.SoundFile(track_path) as f:
+        while True:
+            block = f.read(block_size, dtype="float32", always_2d=True)
+            last = len(block) < block_size
+            mono = block.mean(axis=1)
+            if resampler is not None:
+                mono = resampler.resample_chunk(mono, last=last)
+            mono = mono[:n_out - written]
+            written += len(mono)
+            yield mono
+            if last:
+                break
+    if written < n_out:
+        yield np.zeros(n_out - written, dtype=np.float32)
+
+
+def decode_mono(track_path, sr):
+    # The whole track as mono float32 samples at `sr`, decoded block by block so the
+    # native-rate (and multichannel) audio is never in memory at once. Formats
+    # libsndfile can't read fall back to librosa.load.
+    try:
+        n_out = resampled_length(track_path, sr)
+    except Exception:
+        return librosa.load(track_path, sr=sr)[0]
+    y = np.empty(n_out, dtype=np.float32)
+    written = 0
+    for mono in mono_blocks(track_path, sr):
+        y[written:written + len(mono)] = mono
+        written += len(mono)
+    return y
+
+
+class StreamingFeatures:
+    # Incremental version of SpectralFeatureExtractor over a stream of mono sample
+    # blocks. Framing matches librosa's centred analysis (constant padding of
+    # frame_length // 2 on both ends), so the outputs line up with the in-memory path.
+    # Memory use is bounded by one block plus a frame of carry-over.
+
+    def __init__(self, sr, frame_length=2048, hop_length=512):
+        self.extractor = SpectralFeatureExtractor(sr, frame_length=frame_length, hop_length=hop_length)
+        self.window = scipy.signal.get_window("hann", frame_length, fftbins=True)
+
+        self.carry = np.zeros(frame_length // 2, dtype=np.float32)  # leading centre padding
+        self.prev_mel_db = None
+        self.db_max = -np.inf
+        self.features = {"rms": [], "spectral_centroid": [], "band_energy": [], "onset": []}
+
+    def push(self, samples):
+        frame_length = self.extractor.frame_length
+        hop_length = self.extractor.hop_length
+        buf = np.concatenate([self.carry, np.asarray(samples, dtype=np.float32)])
+        if len(buf) >= frame_length:
+            n_frames = 1 + (len(buf) - frame_length) // hop_length
+            frames = np.lib.stride_tricks.sliding_window_view(buf, frame_length)[::hop_length][:n_frames]
+            self._process(frames)
+            buf = buf[n_frames * hop_length:]
+        self.carry = buf
+
+    def _process(self, frames):
+        self.features["rms"].append(np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=1)))
+
+        S = np.abs(np.fft.rfft(frames * self.window, axis=1)).T  # (bins, frames)
+        features = self.extractor.from_spectrogram(S)
+        for name in ["spectral_centroid", "band_energy"]:
+            self.features[name].append(features[name])
+
+        # Onset strength: median positive log-mel flux, as beat_track computes it.
+        # librosa clips at top_db below the whole-track maximum; here the running
+        # maximum is used, which only differs for bins quieter than 80 dB below the
+        # loudest part of the track.
+        mel_db = features["mel_db"]
+        self.db_max = max(self.db_max, float(mel_db.max()))
+        mel_db = np.maximum(mel_db, self.db_max - self.extractor.top_db)
+        if self.prev_mel_db is not None:
+            mel_db_lagged = np.concatenate([self.prev_mel_db, mel_db], axis=1)
+        else:
+            mel_db_lagged = mel_db
+        self.features["onset"].append(np.median(np.maximum(0.0, np.diff(mel_db_lagged, axis=1)), axis=0))
+        self.prev_mel_db = mel_db[:, -1:]
+
+    def finish(self):
+        # Trailing centre padding, then assemble the feature arrays
+        extractor = self.extractor
+        self.push(np.zeros(extractor.frame_length // 2, dtype=np.float32))
+        rms = np.concatenate(self.features["rms"])
+        n_frames = len(rms)
+
+        # Same lag / centring compensation as librosa.onset.onset_strength
+        pad_width = 1 + extractor.frame_length // (2 * extractor.hop_length)
+        onset_env = np.concatenate([np.zeros(pad_width)] + self.features["onset"])[:n_frames]
+
+        times = librosa.frames_to_time(np.arange(n_frames), sr=extractor.sr, hop_length=extractor.hop_length)
+        return {
+            "rms": rms.astype(np.float32),
+            "rms_times": times,
+            "spectral_centroid": np.concatenate(self.features["spectral_centroid"]),
+            "spectral_times": times,
+            "onset_env": onset_env.astype(np.float32),
+            "band_energy": np.concatenate(self.features["band_energy"], axis=1),
+        }
+
+
+def stream_analysis(track_path, sr=22050, frame_length=2048, hop_length=512, cache_dir=None,
+                    block_duration=30.0, key=None):
+    # Bounded-memory analysis for long mixes. The track is read in blocks, mixed to
+    # mono, resampled with a streaming soxr resampler and fed to StreamingFeatures.
+    # The mono samples go straight into the cache's .npy file, which is then
+    # memory-mapped for the waveform instead of being held in RAM.
+    cache_dir = cache_dir or ANALYSIS_CACHE_DIR
+    key = key or analysis_cache_key(track_path, sr=sr, frame_length=frame_length, hop_length=hop_length,
+                                    mode="stream")
+    features_path, pcm_path = _cache_paths(cache_dir, key)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    n_out = resampled_length(track_path, sr)
+    tmp_pcm_path = f"{pcm_path}.{os.getpid()}.tmp"
+    pcm_out = np.lib.format.open_memmap(tmp_pcm_path, mode="w+", dtype=np.float32, shape=(n_out,))
+    features = StreamingFeatures(sr, frame_length=frame_length, hop_length=hop_length)
+
+    written = 0
+    for mono in mono_blocks(track_path, sr, block_duration=block_duration):
+        pcm_out[written:written + len(mono)] = mono
+        written += len(mono)
+        features.push(mono)
+    pcm_out.flush()
+    del pcm_out
+    os.replace(tmp_pcm_path, pcm_path)
+
+    analysis = features.finish()
+    analysis["tempo"], analysis["beat_times"] = track_beats(analysis["onset_env"], sr, hop_length,
+                                                            method=BEAT_TRACKER, bpm=TRACK_BPM)
+    analysis["duration"] = n_out / sr
+    _write_atomic(features_path, lambda f: np.savez(f, **analysis))
+
+    analysis["y"] = np.load(pcm_path, mmap_mode="r")
+    analysis["sr"] = sr
+    return analysis
+
+
+def load_analysis(track_path, sr=22050, frame_length=2048, hop_length=512, cache_dir=None, streaming=None):
+    # Returns a dict with the analysis arrays plus the mono samples "y" and "sr".
+    # On a warm run nothing is decoded: features come from the .npz sidecar and
+    # the samples are memory-mapped from the cached .npy file. On a cold run the
+    # track is decoded once, straight to mono at `sr`; those samples only live
+    # until they're analysed and cached, then get memory-mapped like a warm run's.
+    if streaming is None:
+        streaming = should_stream(track_path)
+    # Hash the track once for both the cache lookup and, on a miss, the write
+    key = analysis_cache_key(track_path, sr=sr, frame_length=frame_length, hop_length=hop_length,
+                             mode="stream" if streaming else "full")
+    analysis = read_cached_analysis(track_path, sr=sr, frame_length=frame_length,
+                                    hop_length=hop_length, cache_dir=cache_dir, key=key)
+    if analysis is not None:
+        return analysis
+
+    if streaming:
+        print(f"Analysing {track_path} in streaming mode (no cached analysis found)")
+        return stream_analysis(track_path, sr=sr, frame_length=frame_length,
+                               hop_length=hop_length, cache_dir=cache_dir, key=key)
+
+    print(f"Analysing {track_path} (no cached analysis found)")
+    y = decode_mono(track_path, sr)
+    return analyze_samples(track_path, y, sr, frame_length=frame_length,
+                           hop_length=hop_length, cache_dir=cache_dir, key=key)
+
+
+class BeatIndex:
+    # Sorted beat times answering per-frame beat queries with np.searchsorted
+    # (O(log n) per lookup) instead of scanning every beat in Python.
+
+    def __init__(self, beat_times):
+        self.beat_times = np.sort(np.asarray(beat_times, dtype=np.float64))
+        # Typical beat period, used to extend the phase before the first and after the last beat
+        if len(self.beat_times) > 1:
+            self.period = float(np.median(np.diff(self.beat_times)))
+        else:
+            self.period = 0.0
+
+    def __len__(self):
+        return len(self.beat_times)
+
+    def lookup(self, times, window=0.1):
+        # Vectorized form: returns (nearest beat distance, on-beat flag, beat phase) for every time at once
+        times = np.asarray(times, dtype=np.float64)
+        beats = self.beat_times
+        if len(beats) == 0:
+            return (np.full(times.shape, np.inf), np.zeros(times.shape, dtype=bool), np.zeros(times.shape))
+
+        # Index of the first beat strictly after each time
+        idx = np.searchsorted(beats, times, side="right")
+        prev_beat = beats[np.clip(idx - 1, 0, len(beats) - 1)]
+        next_beat = beats[np.clip(idx, 0, len(beats) - 1)]
+
+        distance = np.minimum(np.abs(times - prev_beat), np.abs(next_beat - times))
+        on_beat = distance < window
+
+        # Phase runs 0 -> 1 from one beat to the next
+        with np.errstate(divide="ignore", invalid="ignore"):
+            phase = np.where(next_beat > prev_beat, (times - prev_beat) / (next_beat - prev_beat), 0.0)
+        if self.period > 0:
+            before = idx == 0
+            after = idx == len(beats)
+            phase = np.where(before, 1.0 - ((beats[0] - times) / self.period) % 1.0, phase)
+            phase = np.where(after, ((times - beats[-1]) / self.period) % 1.0, phase)
+        phase = np.mod(phase, 1.0)
+
+        return distance, on_beat, phase
+
+    def nearest_distance(self, t):
+        # Distance in seconds from t to the closest beat
+        beats = self.beat_times
+        if len(beats) == 0:
+            return float("inf")
+        idx = int(np.searchsorted(beats, t))
+        best = float("inf")
+        if idx > 0:
+            best = t - beats[idx - 1]
+        if idx < len(beats):
+            best = min(best, beats[idx] - t)
+        return float(best)
+
+    def is_on_beat(self, t, window=0.1):
+        # True when t is within `window` seconds of a beat
+        return self.nearest_distance(t) < window
+
+    def phase(self, t):
+        # Position between the surrounding beats, 0 on a beat and approaching 1 just before the next
+        return float(self.lookup(np.array([t]))[2][0])
+
+
+def _normalise(values):
+    # Scale to 0-1 using the full-track range (flat signals map to 0)
+    lo, hi = np.min(values), np.max(values)
+    if hi <= lo:
+        return np.zeros_like(values)
+    return (values - lo) / (hi - lo)
+
+
+def band_levels(band_energy, range_db=45.0):
+    # Band power -> 0-1 display levels. Each band is scaled in dB against its own
+    # loud end (98th percentile), so quiet high bands still move the bars.
+    band_db = librosa.power_to_db(np.asarray(band_energy, dtype=np.float64), ref=1.0, top_db=None)
+    hi = np.percentile(band_db, 98, axis=1, keepdims=True)
+    return np.clip((band_db - (hi - range_db)) / range_db, 0.0, 1.0)
+
+
+def _resample_rows(values, src_times, dst_times):
+    # Linear interpolation of a (features, src_frames) matrix onto dst_times in one
+    # vectorized pass; returns a contiguous (dst_frames, features) float32 matrix
+    pos = np.interp(dst_times, src_times, np.arange(len(src_times), dtype=np.float64))
+    i0 = np.floor(pos).astype(int)
+    i1 = np.minimum(i0 + 1, len(src_times) - 1)
+    w = (pos - i0)[:, None]
+    values = np.asarray(values).T
+    return np.ascontiguousarray(values[i0] * (1.0 - w) + values[i1] * w, dtype=np.float32)
+
+
+class FeatureTimeline:
+    # Audio features resampled once onto the video frame grid, so frame
+    # callbacks just index contiguous float32 arrays by frame number.
+
+    def __init__(self, analysis, duration, fps=24, beat_window=0.1, beat_decay=0.15, beat_index=None):
+        self.fps = fps
+        self.duration = duration
+        self.n_frames = int(duration * fps) + 1
+        self.times = np.arange(self.n_frames, dtype=np.float64) / fps
+
+        # Normalise on the analysis frames (like the scripts did with min_rms/max_rms), then resample
+        energy = _normalise(np.asarray(analysis["rms"], dtype=np.float64))
+        spectral = _normalise(np.asarray(analysis["spectral_centroid"], dtype=np.float64))
+        self.energy_factor = np.ascontiguousarray(
+            np.interp(self.times, analysis["rms_times"], energy), dtype=np.float32)
+        self.spectral_factor = np.ascontiguousarray(
+            np.interp(self.times, analysis["spectral_times"], spectral), dtype=np.float32)
+
+        beat_index = beat_index if beat_index is not None else BeatIndex(analysis["beat_times"])
+        distance, on_beat, _ = beat_index.lookup(self.times, window=beat_window)
+        self.beat_distance = np.ascontiguousarray(np.minimum(distance, 1.0), dtype=np.float32)
+        self.on_beat = np.ascontiguousarray(on_beat, dtype=np.float32)
+        # 1 on a beat, falling linearly to 0 at `beat_decay` seconds away from it
+        self.beat_pulse = np.ascontiguousarray(np.clip(1.0 - distance / beat_decay, 0.0, 1.0), dtype=np.float32)
+
+        # Frames x bands matrix of 0-1 band levels, one row per video frame
+        if "band_energy" in analysis:
+            self.band_energy = _resample_rows(band_levels(analysis["band_energy"]), analysis["rms_times"], self.times)
+
+    def __len__(self):
+        return self.n_frames
+
+    def index(self, t):
+        # Frame number for time t (moviepy asks for t = i / fps)
+        return min(max(int(round(t * self.fps)), 0), self.n_frames - 1)
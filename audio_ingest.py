@@ -0,0 +1,13 @@
+from audio_analysis import load_analysis
+
+
+def ingest_audio(track_path, sr=22050, frame_length=2048, hop_length=512, cache_dir=None, streaming=None):
+    # Single audio ingest stage shared by analysis and the waveform drawing.
+    # Returns a dict with:
+    #   "analysis" - analysis dict from audio_analysis (including mono samples "y" at `sr`)
+    #   "duration" - track length in seconds
+    # No audio clip is built here: the soundtrack is muxed straight from track_path
+    # by ffmpeg (FrameWriter / write_segmented, or an AudioFileClip made at write time).
+    analysis = load_analysis(track_path, sr=sr, frame_length=frame_length, hop_length=hop_length,
+                             cache_dir=cache_dir, streaming=streaming)
+    return {"analysis": analysis, "duration": analysis["duration"]}
@@ -0,0 +1,80 @@
+import numpy as np
+from PIL import Image, ImageEnhance
+from blur import gaussian_blur
+from settings import BG_BLUR_LEVELS
+
+# Audio-reactive background blur without per-frame filtering. The cover never
+# changes, so it's blurred, dimmed and scaled to the output size once for each
+# of a few blur radii; a frame at any radius in between is a blend of the two
+# nearest levels, which is a couple of integer multiply-adds per pixel instead
+# of a full-resolution blur, brightness pass and resize.
+#
+# Everything else about the background that doesn't change over time is folded
+# into the levels too: a constant opacity over a solid background colour, and
+# where the cover sits in the frame (only the visible part is kept and blended).
+
+
+class BlurredBackground:
+
+    def __init__(self, image, height, radii=None, brightness=1.0, opacity=1.0, frame_size=None, color=(0, 0, 0)):
+        # `image` is a path or PIL image; levels are scaled to `height` keeping the aspect ratio.
+        # With a frame size, frames are that size: the cover centred over `color` at
+        # `opacity`, as set_position('center').set_opacity(opacity) over a ColorClip would give.
+        if not isinstance(image, Image.Image):
+            image = Image.open(image)
+        image = image.convert("RGB")
+        self.radii = np.array(sorted(radii or BG_BLUR_LEVELS), dtype=np.float64)
+        self.size = (int(round(image.width * height / image.height)), int(round(height)))
+        frame_size = frame_size or self.size
+
+        # Part of the cover inside the frame, and where it lands (moviepy centres
+        # with int((frame - clip) / 2), truncating towards zero)
+        x, y = int((frame_size[0] - self.size[0]) / 2), int((frame_size[1] - self.size[1]) / 2)
+        left, top = max(0, -x), max(0, -y)
+        right, bottom = min(self.size[0], frame_size[0] - x), min(self.size[1], frame_size[1] - y)
+
+        # Same steps, in the same order, as filtering every frame did: blur at
+        # source resolution, dim, resize (LANCZOS, as the scripts' resizer), then
+        # moviepy's opacity blend over the background colour
+        self.levels = []
+        for radius in self.radii:
+            level = gaussian_blur(image, radius)
+            level = ImageEnhance.Brightness(level).enhance(brightness)
+            level = np.array(level.resize(self.size, Image.LANCZOS))[top:bottom, left:right]
+            if opacity < 1.0:
+                level = (opacity * level + (1.0 - opacity) * np.array(color, dtype=np.float64)).astype(np.uint8)
+            self.levels.append(level)
+        self.wide = [level.astype(np.uint16) for level in self.levels]
+
+        # Output frame (background colour outside the cover) and blend buffers, reused every frame
+        self.frame = np.empty((frame_size[1], frame_size[0], 3), dtype=np.uint8)
+        self.frame[:] = color
+        self.view = self.frame[max(0, y):max(0, y) + bottom - top, max(0, x):max(0, x) + right - left]
+        self.acc = np.empty(self.view.shape, dtype=np.uint16)
+        self.tmp = np.empty(self.view.shape, dtype=np.uint16)
+
+    @property
+    def nbytes(self):
+        return sum(level.nbytes for level in self.levels) + sum(level.nbytes for level in self.wide)
+
+    def render(self, radius):
+        # RGB frame at the given blur radius; radii outside the levels clamp to
+        # the nearest one. The returned array is reused by the next call.
+        radius = float(radius)
+        i = int(np.searchsorted(self.radii, radius))
+        if i == 0 or i == len(self.radii):
+            np.copyto(self.view, self.levels[min(i, len(self.radii) - 1)])
+            return self.frame
+        lo, hi = self.radii[i - 1], self.radii[i]
+        # Blend weight in 1/256ths, fixed point so the blend stays in uint16
+        weight = int(round((radius - lo) / (hi - lo) * 256))
+        if weight == 0 or weight == 256:
+            np.copyto(self.view, self.levels[i - 1 if weight == 0 else i])
+            return self.frame
+        np.multiply(self.wide[i - 1], 256 - weight, out=self.acc)
+        np.multiply(self.wide[i], weight, out=self.tmp)
+        self.acc += self.tmp
+        self.acc += 128
+        self.acc >>= 8
+        np.copyto(self.view, self.acc, casting="unsafe")
+        return self.frame
@@ -0,0 +1,118 @@
+import os
+import sys
+import csv
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from audio_analysis import load_analysis, get_analysis_profile
+
+# Pre-analyse a whole release before rendering. Each track is decoded and analysed
+# in its own process and stored in the analysis cache, so the render scripts
+# start from a warm cache.
+#
+# Usage: python batch_analysis.py <track or directory> [...] [--workers N] [--summary summary.csv]
+#                                 [--profile precise|fast]
+
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".flac", ".ogg", ".m4a", ".aif", ".aiff")
+
+
+def find_tracks(paths):
+    # Returns (tracks, missing): a mistyped path is reported and skipped rather than
+    # stopping the whole batch
+    tracks, missing = [], []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(AUDIO_EXTENSIONS):
+                    tracks.append(os.path.join(path, name))
+        elif os.path.isfile(path):
+            tracks.append(path)
+        else:
+            missing.append(path)
+    return tracks, missing
+
+
+def analyse_track(track_path, profile=None):
+    # Runs in a worker process. Only the summary comes back; the arrays stay in the cache.
+    start = time.time()
+    analysis = load_analysis(track_path, **get_analysis_profile(profile))
+    rms = np.asarray(analysis["rms"], dtype=np.float64)
+    loudness = 10 * np.log10(max(np.mean(rms ** 2), 1e-10))
+    return {
+        "track": track_path,
+        "tempo": analysis["tempo"],
+        "beats": len(analysis["beat_times"]),
+        "duration": analysis["duration"],
+        "loudness_db": float(loudness),
+        "seconds": time.time() - start,
+    }
+
+
+def print_summary(results):
+    name_width = max([len(os.path.basename(r["track"])) for r in results] + [5])
+    print(f"\n{'Track':<{name_width}}  {'Tempo':>7}  {'Beats':>6}  {'Duration':>8}  {'Loudness':>9}")
+    for r in results:
+        minutes, seconds = divmod(int(r["duration"]), 60)
+        print(f"{os.path.basename(r['track']):<{name_width}}  {r['tempo']:>7.2f}  {r['beats']:>6}  "
+              f"{minutes:>5}:{seconds:02d}  {r['loudness_db']:>6.1f} dB")
+
+
+def write_summary(results, summary_path):
+    with open(summary_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["track", "tempo", "beats", "duration", "loudness_db"])
+        writer.writeheader()
+        for r in results:
+            writer.writerow({key: r[key] for key in writer.fieldnames})
+    print(f"Summary written to {summary_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse a catalogue of tracks in parallel")
+    parser.add_argument("paths", nargs="+", help="audio files or directories of audio files")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+    parser.add_argument("--summary", help="also write the summary table to this CSV file")
+    parser.add_argument("--profile", help="analysis profile: precise or fast (default: ANALYSIS_PROFILE or precise)")
+    args = parser.parse_args()
+    try:
+        get_analysis_profile(args.profile)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    tracks, missing = find_tracks(args.paths)
+    for path in missing:
+        print(f"Failed to analyse {path}: no such file")
+    if not tracks:
+        print("No audio files found")
+        sys.exit(1)
+
+    # Start the biggest files first so the longest track isn't left running on its own at the end
+    # (a file that disappears in the meantime sorts last and fails in its worker)
+    tracks.sort(key=lambda path: os.path.getsize(path) if os.path.isfile(path) else 0, reverse=True)
+    workers = max(1, min(args.workers, len(tracks)))
+    print(f"Analysing {len(tracks)} tracks with {workers} workers")
+
+    start = time.time()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(analyse_track, track, args.profile): track for track in tracks}
+        for future in as_completed(futures):
+            track = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Failed to analyse {track}: {e}")
+                continue
+            results.append(result)
+            print(f"Finished {os.path.basename(track)} in {result['seconds']:.1f} seconds")
+
+    results.sort(key=lambda r: r["track"])
+    print_summary(results)
+    print(f"\nAnalysed {len(results)}/{len(tracks) + len(missing)} tracks in {time.time() - start:.1f} seconds")
+    if args.summary:
+        write_summary(results, args.summary)
+
+
+if __name__ == "__main__":
+    main()
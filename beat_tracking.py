@@ -0,0 +1,106 @@
+import numpy as np
+import librosa
+
+# Beat-tracking backends. Each one takes the onset envelope the analysis already
+# computes and returns (tempo in BPM, beat frame indices).
+#
+#   librosa     - librosa.beat.beat_track (dynamic programming, the original engine)
+#   onset_grid  - global tempo estimate, fixed beat grid, each beat snapped to the
+#                 strongest onset near it. Much cheaper; good for steady dance music.
+#   bpm_grid    - fixed grid at a user-supplied BPM (TRACK_BPM), only the phase is
+#                 estimated. Cheapest; for tracks with a known, constant tempo.
+
+
+def librosa_beats(onset_env, sr, hop_length, bpm=None):
+    tempo, beats = librosa.beat.beat_track(onset_envelope=onset_env, sr=sr, hop_length=hop_length,
+                                           start_bpm=bpm or 120.0)
+    return float(np.asarray(tempo).reshape(-1)[0]), np.asarray(beats, dtype=int)
+
+
+def _grid_phase(onset_env, period):
+    # Offset (in frames) of the beat grid that lines up with the most onset energy
+    n_beats = int(len(onset_env) / period)
+    if n_beats < 1:
+        return 0.0
+    offsets = np.arange(int(np.ceil(period)), dtype=np.float64)
+    positions = np.round(offsets[:, None] + np.arange(n_beats) * period).astype(int)
+    positions = np.minimum(positions, len(onset_env) - 1)
+    return float(offsets[np.argmax(onset_env[positions].sum(axis=1))])
+
+
+def _grid_frames(onset_env, period):
+    phase = _grid_phase(onset_env, period)
+    return np.round(np.arange(phase, len(onset_env), period)).astype(int)
+
+
+def bpm_grid_beats(onset_env, sr, hop_length, bpm=None):
+    if not bpm:
+        raise ValueError("The bpm_grid beat tracker needs a BPM (set TRACK_BPM)")
+    period = 60.0 * sr / (hop_length * float(bpm))
+    return float(bpm), _grid_frames(onset_env, period)
+
+
+def _estimate_period(onset_env, sr, hop_length, start_bpm=120.0, std_bpm=1.0):
+    # Global beat period in frames from one FFT autocorrelation of the onset
+    # envelope, weighted by the same log-normal tempo prior librosa uses
+    env = onset_env - np.mean(onset_env)
+    n = len(env)
+    spectrum = np.fft.rfft(env, 2 * n)
+    autocorr = np.fft.irfft(spectrum * np.conj(spectrum))[:n]
+
+    lags = np.arange(max(1, int(60.0 * sr / (hop_length * 300.0))),
+                     min(n - 1, int(60.0 * sr / (hop_length * 30.0))) + 1)
+    if len(lags) < 3:
+        return 60.0 * sr / (hop_length * start_bpm)
+    bpms = 60.0 * sr / (hop_length * lags)
+    prior = np.exp(-0.5 * (np.log2(bpms / start_bpm) / std_bpm) ** 2)
+    lag = float(lags[int(np.argmax(autocorr[lags] * prior))])
+
+    # The autocorrelation also peaks at whole multiples of the period; locating a
+    # far multiple and dividing back down pins the period to a small fraction of a frame
+    for multiple in (1, 4, 16, 64):
+        center = int(round(lag * multiple))
+        if center + 2 >= n // 2:
+            break
+        peak = center - 2 + int(np.argmax(autocorr[center - 2:center + 3]))
+        a, b, c = autocorr[peak - 1], autocorr[peak], autocorr[peak + 1]
+        offset = 0.5 * (a - c) / (a - 2 * b + c) if a - 2 * b + c != 0 else 0.0
+        lag = (peak + offset) / multiple
+    return lag
+
+
+def _snap_to_peaks(onset_env, grid, radius):
+    # Move each grid beat to the strongest onset within +/- radius frames
+    offsets = np.arange(-radius, radius + 1)
+    window = np.clip(grid[:, None] + offsets, 0, len(onset_env) - 1)
+    return window[np.arange(len(grid)), np.argmax(onset_env[window], axis=1)]
+
+
+def onset_grid_beats(onset_env, sr, hop_length, bpm=None):
+    period = 60.0 * sr / (hop_length * bpm) if bpm else _estimate_period(onset_env, sr, hop_length)
+    grid = _grid_frames(onset_env, period)
+    if len(grid) < 2:
+        return 60.0 * sr / (hop_length * period), grid
+
+    # Snap to onset peaks, then refit one straight grid through the snapped beats
+    # so small tempo errors don't accumulate into drift over the track
+    snapped = _snap_to_peaks(onset_env, grid, max(1, int(period * 0.15)))
+    period, phase = np.polyfit(np.arange(len(snapped)), snapped, 1)
+    grid = np.round(np.arange(phase % period, len(onset_env), period)).astype(int)
+    beats = np.unique(_snap_to_peaks(onset_env, grid, max(1, int(period * 0.1))))
+    return float(60.0 * sr / (hop_length * period)), beats
+
+
+BEAT_TRACKERS = {
+    "librosa": librosa_beats,
+    "onset_grid": onset_grid_beats,
+    "bpm_grid": bpm_grid_beats,
+}
+
+
+def track_beats(onset_env, sr, hop_length, method="librosa", bpm=None):
+    # Returns (tempo, beat_times) from the chosen backend
+    if method not in BEAT_TRACKERS:
+        raise ValueError(f"Unknown beat tracker {method!r} (choose from {', '.join(BEAT_TRACKERS)})")
+    tempo, beats = BEAT_TRACKERS[method](np.asarray(onset_env, dtype=np.float64), sr, hop_length, bpm=bpm)
+    return tempo, librosa.frames_to_time(beats, sr=sr, hop_length=hop_length)
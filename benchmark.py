@@ -0,0 +1,908 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import tracemalloc
+import subprocess
+import colorsys
+import random
+from dotenv import load_dotenv
+import numpy as np
+import librosa
+from audio_analysis import (compute_analysis, get_analysis_profile, BeatIndex, FeatureTimeline, ANALYSIS_PROFILES,
+                            SpectralFeatureExtractor, TRACK_BPM)
+from beat_tracking import BEAT_TRACKERS, track_beats
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter, ImageFont
+from title_effects import GLOW_PAD, GlowCache, GlowMaskCache, RadialGlow, TitleRaster, WaveformLine, render_title_glow, tint_alpha
+from blur import BLUR_QUALITIES, BLUR_QUALITY, gaussian_blur
+from layers import Layer, layer_clip
+from moviepy.editor import ColorClip, CompositeVideoClip, ImageClip, VideoClip
+from moviepy.config import get_setting
+from compositor import composite_clip
+from video_writer import FrameWriter
+from frame_pool import render_frames, write_segmented
+from frame_random import frame_rng
+from segment_timeline import SegmentTimeline
+from background import BlurredBackground
+
+# Usage: python benchmark.py [name ...]   (runs every benchmark when no names are given)
+
+# Load environment variables
+load_dotenv()
+TRACK_PATH = os.getenv("TRACK_PATH", "do_the_loftwah.mp3")
+IMAGE_PATH = os.getenv("IMAGE_PATH", "cover.jpg")
+TITLE = os.getenv("TITLE", "Do the Loftwah")
+
+
+def timed(func, repeat=3):
+    # Best wall time over a few runs, plus the result of the last run
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_analysis():
+    # Single-STFT extractor vs the separate librosa calls the scripts used to make
+    print(f"\n== Analysis: single STFT vs separate librosa calls ({TRACK_PATH})")
+    y, sr = librosa.load(TRACK_PATH)
+    print(f"Loaded {len(y) / sr:.1f} seconds at {sr}Hz")
+
+    def librosa_sequence():
+        tempo, beats = librosa.beat.beat_track(y=y, sr=sr)
+        rms = librosa.feature.rms(y=y, frame_length=2048, hop_length=512)[0]
+        spectral_centroid = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
+        return librosa.frames_to_time(beats, sr=sr), rms, spectral_centroid
+
+    # Warm up numba before timing anything
+    librosa_sequence()
+
+    old_time, (old_beats, old_rms, old_centroid) = timed(librosa_sequence)
+    new_time, analysis = timed(lambda: compute_analysis(y, sr))
+
+    print(f"librosa sequence: {old_time:.3f}s")
+    print(f"single STFT:      {new_time:.3f}s ({old_time / new_time:.2f}x, also computes "
+          f"{analysis['band_energy'].shape[0]} band energies)")
+    print(f"max RMS difference:      {np.max(np.abs(old_rms - analysis['rms'])):.2e}")
+    print(f"max centroid difference: {np.max(np.abs(old_centroid - analysis['spectral_centroid'])):.2e} Hz")
+    if len(old_beats) == len(analysis["beat_times"]):
+        print(f"beats: {len(old_beats)}, max beat time difference "
+              f"{np.max(np.abs(old_beats - analysis['beat_times']), initial=0):.4f}s")
+    else:
+        print(f"beats: {len(old_beats)} vs {len(analysis['beat_times'])}")
+
+
+def bench_profiles():
+    # Decode + analysis time for each profile, and how far "fast" drifts from "precise"
+    print(f"\n== Analysis profiles ({TRACK_PATH})")
+    results = {}
+    for name in ANALYSIS_PROFILES:
+        profile = get_analysis_profile(name)
+
+        def run():
+            y, sr = librosa.load(TRACK_PATH, sr=profile["sr"])
+            return compute_analysis(y, sr, frame_length=profile["frame_length"], hop_length=profile["hop_length"])
+
+        run()  # warm up numba
+        elapsed, analysis = timed(run)
+        results[name] = (elapsed, analysis)
+        print(f"{name:>8}: {elapsed:.3f}s  sr={profile['sr']} hop={profile['hop_length']}  "
+              f"tempo {analysis['tempo']:.2f} BPM, {len(analysis['beat_times'])} beats")
+
+    precise_time, precise = results["precise"]
+    fast_time, fast = results["fast"]
+    print(f"fast profile speedup: {precise_time / fast_time:.2f}x")
+
+    # Beat drift: for every precise beat, the distance to the nearest fast beat
+    fast_beats = BeatIndex(fast["beat_times"])
+    drift = np.array([fast_beats.nearest_distance(t) for t in precise["beat_times"]])
+    if len(drift):
+        print(f"beat drift: mean {np.mean(drift) * 1000:.1f} ms, 95th percentile "
+              f"{np.percentile(drift, 95) * 1000:.1f} ms, max {np.max(drift) * 1000:.1f} ms, "
+              f"{np.mean(drift < 1 / 24) * 100:.0f}% within one video frame")
+
+    # Curve drift on the 24 fps grid the effects actually sample
+    duration = min(precise["duration"], fast["duration"])
+    precise_timeline = FeatureTimeline(precise, duration)
+    fast_timeline = FeatureTimeline(fast, duration)
+    for feature in ["energy_factor", "spectral_factor"]:
+        diff = np.abs(getattr(precise_timeline, feature) - getattr(fast_timeline, feature))
+        print(f"{feature} drift (0-1 scale): mean {np.mean(diff):.4f}, max {np.max(diff):.4f}")
+
+
+def beat_f_measure(reference, estimated, tolerance=0.07):
+    # Standard beat-tracking F-measure: a beat counts as a hit within +/- 70 ms of a reference beat
+    if len(reference) == 0 or len(estimated) == 0:
+        return 0.0
+    index = BeatIndex(estimated)
+    hits = sum(index.nearest_distance(t) <= tolerance for t in reference)
+    precision = hits / len(estimated)
+    recall = hits / len(reference)
+    return 0.0 if hits == 0 else 2 * precision * recall / (precision + recall)
+
+
+def click_track(bpm, duration=60.0, sr=22050, seed=0):
+    # Synthetic test signal: clicks on every beat over a little noise, starting off the grid origin
+    rng = np.random.default_rng(seed)
+    beat_times = np.arange(0.37, duration, 60.0 / bpm)
+    y = librosa.clicks(times=beat_times, sr=sr, length=int(duration * sr))
+    y += 0.02 * rng.standard_normal(len(y))
+    return y.astype(np.float32), beat_times
+
+
+def bench_beats():
+    # Runtime and agreement of each beat tracker on click tracks and on TRACK_PATH
+    print("\n== Beat trackers")
+    sr, hop_length = 22050, 512
+    extractor = SpectralFeatureExtractor(sr, hop_length=hop_length)
+    cases = [(f"click track {bpm} BPM", *click_track(bpm, sr=sr), bpm) for bpm in (92, 128, 174)]
+    if os.path.exists(TRACK_PATH):
+        y, _ = librosa.load(TRACK_PATH, sr=sr)
+        cases.append((TRACK_PATH, y, None, TRACK_BPM))
+
+    for name, y, truth, bpm in cases:
+        onset_env = extractor.extract(y)["onset_env"]
+        print(f"\n{name}:")
+        results = {}
+        for method in BEAT_TRACKERS:
+            if method == "bpm_grid" and not bpm:
+                print(f"  {method:<11} skipped (set TRACK_BPM to include it)")
+                continue
+            # Only the BPM grid is told the tempo; the others have to find it
+            method_bpm = bpm if method == "bpm_grid" else None
+            track_beats(onset_env, sr, hop_length, method=method, bpm=method_bpm)  # warm up numba
+            elapsed, (tempo, beat_times) = timed(
+                lambda: track_beats(onset_env, sr, hop_length, method=method, bpm=method_bpm))
+            results[method] = beat_times
+            line = f"  {method:<11} {elapsed * 1000:8.2f} ms  tempo {tempo:6.2f}  {len(beat_times):4d} beats"
+            if truth is not None:
+                line += f"  F-measure vs truth {beat_f_measure(truth, beat_times):.3f}"
+            print(line)
+        if truth is None:
+            for method, beat_times in results.items():
+                if method != "librosa":
+                    print(f"  {method} agreement with librosa: F-measure "
+                          f"{beat_f_measure(results['librosa'], beat_times):.3f}")
+
+
+def bench_font(fontsize):
+    try:
+        return ImageFont.truetype("DejaVuSans-Bold.ttf", fontsize)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def title_raster(text, fontsize=90):
+    # RGBA title with antialiased alpha edges, like the image ImageMagick renders for
+    # a TextClip (see title_clip for what the scripts actually get from moviepy)
+    font = bench_font(fontsize)
+    left, top, right, bottom = ImageDraw.Draw(Image.new('RGBA', (1, 1))).textbbox((0, 0), text, font=font)
+    img = Image.new('RGBA', (right - left + 20, bottom - top + 20), (0, 0, 0, 0))
+    ImageDraw.Draw(img).text((10 - left, 10 - top), text, font=font, fill=(255, 255, 255, 255))
+    return np.array(img)
+
+
+def title_clip(text, fontsize=90):
+    # The title as the scripts get it: TextClip is an ImageClip(..., transparent=True)
+    # of the rendered RGBA image, so its frames are RGB and the alpha is a float mask
+    return ImageClip(title_raster(text, fontsize), transparent=True)
+
+
+def script_title(text):
+    # TitleRaster exactly as script.py and script2.py build it from their TextClip
+    clip = title_clip(text)
+    return TitleRaster(clip.get_frame(0), mask=clip.mask.get_frame(0), pad=GLOW_PAD)
+
+
+def legacy_title_glow(image, glow_strength, glow_radius, glow_colors):
+    # The per-pixel getpixel/putpixel title glow render_title_glow replaced, kept as the reference
+    img = Image.fromarray(image)
+    colored_img = Image.new('RGBA', img.size)
+    for x in range(img.width):
+        for y in range(img.height):
+            pixel = img.getpixel((x, y))
+            if len(pixel) > 3 and pixel[3] > 0:
+                colored_img.putpixel((x, y), (255, 255, 255, pixel[3]))
+            else:
+                colored_img.putpixel((x, y), (0, 0, 0, 0))
+    result = Image.new('RGBA', img.size, (0, 0, 0, 0))
+    for i in range(3):
+        current_radius = float(glow_radius * (1 - i * 0.3))
+        layer_r, layer_g, layer_b = glow_colors[i]
+        glow_layer = Image.new('RGBA', img.size)
+        for x in range(img.width):
+            for y in range(img.height):
+                pixel = img.getpixel((x, y))
+                if len(pixel) > 3 and pixel[3] > 0:
+                    alpha = min(255, int(pixel[3] * glow_strength * (1 - i * 0.3)))
+                    glow_layer.putpixel((x, y), (layer_r, layer_g, layer_b, alpha))
+                else:
+                    glow_layer.putpixel((x, y), (0, 0, 0, 0))
+        glow_layer = glow_layer.filter(ImageFilter.GaussianBlur(radius=current_radius))
+        result = Image.alpha_composite(result, glow_layer)
+    return Image.alpha_composite(result, colored_img)
+
+
+def bench_title():
+    # Regression check and fps for the title glow: NumPy recolouring vs the old per-pixel loops
+    print(f"\n== Title glow ({TITLE!r})")
+    image = title_raster(TITLE)
+    print(f"Title raster {image.shape[1]}x{image.shape[0]}")
+    white = [(255, 255, 255)] * 3
+    rainbow = [(255, 64, 64), (64, 255, 64), (64, 64, 255)]
+
+    # Glow settings the scripts produce on and off the beat (float32 energy from the timeline)
+    cases = []
+    for energy in np.linspace(0, 1, 4, dtype=np.float32):
+        cases.append((1.0 + energy, 5 + energy * 10))
+        cases.append((0.5 + (energy * 0.5), 2 + energy * 5))
+
+    max_diff = 0
+    for glow_strength, glow_radius in cases[:3]:
+        for colors in (white, rainbow):
+            old = np.array(legacy_title_glow(image, glow_strength, glow_radius, colors), dtype=np.int16)
+            new = np.array(render_title_glow(image, glow_strength, glow_radius, colors), dtype=np.int16)
+            max_diff = max(max_diff, int(np.max(np.abs(old - new))))
+    # The scripts' path: a TextClip's RGB frame plus its separate mask, against the
+    # per-pixel loops on the RGBA image it was made from
+    clip = title_clip(TITLE)
+    title = TitleRaster(clip.get_frame(0), mask=clip.mask.get_frame(0))
+    if not title.alpha.any():
+        print("Title raster built from the TextClip-shaped input is blank")
+        sys.exit(1)
+    for colors in (white, rainbow):
+        old = np.array(legacy_title_glow(image, *cases[0], colors), dtype=np.int16)
+        new = np.array(render_title_glow(title, *cases[0], colors), dtype=np.int16)
+        max_diff = max(max_diff, int(np.max(np.abs(old - new))))
+    print(f"max pixel difference vs per-pixel loops (RGBA image and RGB frame + mask): {max_diff}")
+
+    old_time, _ = timed(lambda: legacy_title_glow(image, *cases[0], white), repeat=1)
+    new_time, _ = timed(lambda: [render_title_glow(image, *case, white) for case in cases])
+    new_time /= len(cases)
+    print(f"per-pixel loops: {1 / old_time:8.2f} fps")
+    print(f"NumPy alpha ops: {1 / new_time:8.2f} fps ({old_time / new_time:.1f}x)")
+    if BLUR_QUALITY != "exact":
+        print(f"(BLUR_QUALITY={BLUR_QUALITY}, so the difference includes the blur approximation)")
+    elif max_diff:
+        print("Title glow output differs from the per-pixel implementation")
+        sys.exit(1)
+
+
+def title_glow_settings(timeline, frames):
+    # (glow_strength, glow_radius) per frame, exactly as script.py's title_transform derives them
+    settings = []
+    for frame in range(frames):
+        energy_factor = timeline.energy_factor[frame]
+        if timeline.on_beat[frame]:
+            settings.append((1.0 + energy_factor, 5 + energy_factor * 10))
+        else:
+            settings.append((0.5 + (energy_factor * 0.5), 2 + energy_factor * 5))
+    return settings
+
+
+def rainbow_glow_colors(timeline, frames, base_hue=0.6, saturation=0.8, brightness=0.7):
+    # Per-frame glow layer colours as script2.py's title_transform picks them (with its default colours)
+    colors = []
+    for frame in range(frames):
+        rainbow_hue = (base_hue + (timeline.times[frame] / 10) % 1.0 + 0.3 * timeline.spectral_factor[frame]) % 1.0
+        colors.append([[int(255 * c) for c in colorsys.hsv_to_rgb((rainbow_hue + i * 0.2) % 1.0, saturation, brightness)]
+                       for i in range(3)])
+    return colors
+
+
+def compare_glow(name, image, settings, colors, cache):
+    # Exact glow layers every frame vs the given cache: fps, pixel error and the cache report
+    exact_time, exact = timed(lambda: [np.array(render_title_glow(image, *s, c))
+                                       for s, c in zip(settings, colors)], repeat=1)
+    cached_time, cached = timed(lambda: [np.array(render_title_glow(image, *s, c, cache=cache))
+                                         for s, c in zip(settings, colors)], repeat=1)
+    errors = np.array([np.max(np.abs(a.astype(np.int16) - b)) for a, b in zip(exact, cached)])
+    print(f"{name}:")
+    print(f"  exact layers: {len(settings) / exact_time:8.2f} fps")
+    print(f"  cached:       {len(settings) / cached_time:8.2f} fps ({exact_time / cached_time:.1f}x)")
+    print(f"  pixel error vs exact: mean of frame maxima {np.mean(errors):.1f}, worst {np.max(errors)} (0-255)")
+    print("  ", end="")
+    cache.report()
+
+
+def bench_glow_cache(seconds=20):
+    # Exact glow layers every frame vs the quantized caches, over the first seconds of TRACK_PATH
+    print(f"\n== Glow cache ({TRACK_PATH}, first {seconds} seconds)")
+    profile = get_analysis_profile()
+    y, sr = librosa.load(TRACK_PATH, sr=profile["sr"], duration=seconds)
+    analysis = compute_analysis(y, sr, frame_length=profile["frame_length"], hop_length=profile["hop_length"])
+    timeline = FeatureTimeline(analysis, analysis["duration"])
+    settings = title_glow_settings(timeline, len(timeline))
+    image = script_title(TITLE)
+    print(f"{len(settings)} frames, title raster {image.size[0]}x{image.size[1]}")
+
+    compare_glow("white glow, RGBA layer cache (script.py)", image, settings,
+                 [[(255, 255, 255)] * 3] * len(settings), GlowCache())
+    compare_glow("rainbow glow, blurred mask cache + per-frame tint (script2.py)", image, settings,
+                 rainbow_glow_colors(timeline, len(settings)), GlowMaskCache())
+
+    # The tint split on its own, without quantization: one blur shared by every colour
+    mask_cache = GlowMaskCache(buckets=10000)
+    tint_error = 0
+    for color in [(255, 64, 64), (10, 200, 90), (120, 30, 250)]:
+        direct = np.array(render_title_glow(image, 1.5, 8.0, [color] * 3), dtype=np.int16)
+        tinted = np.array(render_title_glow(image, 1.5, 8.0, [color] * 3, cache=mask_cache))
+        tint_error = max(tint_error, int(np.max(np.abs(direct - tinted))))
+    print(f"tinting a blurred mask vs blurring the tinted layer: max pixel difference {tint_error}")
+
+
+def blur_cases():
+    # (effect, image, radius) for each place the project blurs, at the sizes it blurs them
+    cases = []
+    if os.path.exists(IMAGE_PATH):
+        cover = Image.open(IMAGE_PATH).convert('RGB')
+    else:
+        rng = np.random.default_rng(0)
+        cover = Image.fromarray(rng.integers(0, 256, (1080, 1080, 3), dtype=np.uint8)).resize((1080, 1080))
+    for radius in (2, 5):
+        cases.append((f"background (r={radius})", cover, radius))
+
+    glow = Image.fromarray(tint_alpha(script_title(TITLE).alpha, (255, 255, 255), 2.0), 'RGBA')
+    for radius in (5, 15):
+        cases.append((f"title glow layer (r={radius})", glow, radius))
+
+    text_layer = Image.new('RGBA', (1280, 720), (0, 0, 0, 0))
+    ImageDraw.Draw(text_layer).text((400, 320), TITLE, fill=(0, 255, 255, 100), font=bench_font(60))
+    cases.append(("visualizer text glow (r=10)", text_layer, 10))
+
+    rng = np.random.default_rng(1)
+    storm = Image.new('RGBA', (1280, 720), (0, 0, 0, 0))
+    storm_draw = ImageDraw.Draw(storm)
+    for _ in range(200):
+        x, y, size = rng.integers(0, 1280), rng.integers(0, 720), rng.integers(5, 40)
+        storm_draw.ellipse([x - size, y - size, x + size, y + size],
+                           fill=tuple(int(c) for c in rng.integers(0, 256, 3)) + (150,))
+    cases.append(("Color Storm particles (r=5)", storm, 5))
+
+    shadow = Image.new('RGBA', (1280, 720), (0, 0, 0, 0))
+    ImageDraw.Draw(shadow).text((405, 325), TITLE, fill=(0, 0, 0, 150), font=bench_font(60))
+    cases.append(("test.py text shadow (r=3)", shadow, 3))
+    return cases
+
+
+def visible(img):
+    # Pixel values as they show up once composited: colour weighted by alpha for RGBA
+    # layers, so colour differences in nearly transparent pixels don't count
+    pixels = np.asarray(img, dtype=np.float64)
+    if pixels.shape[2] == 4:
+        pixels = np.concatenate([pixels[:, :, :3] * pixels[:, :, 3:] / 255.0, pixels[:, :, 3:]], axis=2)
+    return pixels
+
+
+def bench_blur():
+    # Time and max pixel error (vs exact, after alpha weighting) of each blur quality tier, per effect
+    print("\n== Blur quality tiers")
+    print(f"{'effect':<30} {'size':>10}  " + "  ".join(f"{q:>16}" for q in BLUR_QUALITIES))
+    for name, img, radius in blur_cases():
+        exact = visible(gaussian_blur(img, radius, "exact"))
+        columns = []
+        for quality in BLUR_QUALITIES:
+            elapsed, result = timed(lambda: gaussian_blur(img, radius, quality), repeat=5)
+            error = int(round(np.max(np.abs(exact - visible(result)))))
+            columns.append(f"{elapsed * 1000:6.1f}ms err {error:3d}")
+        print(f"{name:<30} {img.width:>4}x{img.height:<5}  " + "  ".join(f"{c:>16}" for c in columns))
+
+
+def ellipse_ring_glow(size, glow_radius, energy_factor, color, blend):
+    # The ring glow as make_title_glow used to draw it: ellipse outlines onto an RGB
+    # canvas (blend=False, where the outline alpha was ignored), or onto a transparent
+    # RGBA canvas with alpha blending (blend=True, what the drawing meant)
+    width, height = size
+    center_x, center_y = width // 2, height // 2
+    if blend:
+        img = Image.new('RGBA', size, tuple(color) + (0,))
+        draw = ImageDraw.Draw(img, 'RGBA')
+    else:
+        img = Image.new('RGB', size, color=(0, 0, 0))
+        draw = ImageDraw.Draw(img)
+    for i in range(3):
+        current_radius = glow_radius * (1 - i * 0.3)
+        alpha = int(100 * (1 - i * 0.3) * energy_factor)
+        for radius in range(int(current_radius), 0, -20):
+            circle_alpha = int(alpha * (radius / current_radius))
+            draw.ellipse([center_x - radius, center_y - radius, center_x + radius, center_y + radius],
+                         outline=tuple(color) + (circle_alpha,), width=10)
+    return np.asarray(img)
+
+
+def bench_radial_glow(size=(1920, 1080)):
+    # Ellipse-drawn ring glow vs the distance-field lookup, at the scripts' output size
+    print(f"\n== Title ring glow ({size[0]}x{size[1]})")
+    glow = RadialGlow(size)
+    settings = [(200 + 100 * energy + 50 * on_beat, energy)
+                for energy in np.linspace(0.05, 1, 8) for on_beat in (0, 1)]
+    white = (255, 255, 255)
+
+    old_time, _ = timed(lambda: [ellipse_ring_glow(size, r, e, white, blend=False) for r, e in settings])
+    blend_time, _ = timed(lambda: [ellipse_ring_glow(size, r, e, white, blend=True) for r, e in settings])
+    new_time, _ = timed(lambda: [glow.render(r, e, white) for r, e in settings])
+    print(f"ellipse outlines, alpha ignored: {len(settings) / old_time:8.2f} fps")
+    print(f"ellipse outlines, alpha blended: {len(settings) / blend_time:8.2f} fps")
+    print(f"distance field:                  {len(settings) / new_time:8.2f} fps "
+          f"({old_time / new_time:.1f}x / {blend_time / new_time:.1f}x)")
+
+    # The old RGB canvas had no alpha at all, so compare against alpha-blended ellipses
+    errors = []
+    for glow_radius, energy_factor in settings:
+        reference = ellipse_ring_glow(size, glow_radius, energy_factor, white, blend=True)[:, :, 3]
+        errors.append(np.abs(reference.astype(np.int16) - glow.render(glow_radius, energy_factor, white)[:, :, 3]))
+    errors = np.array(errors)
+    print(f"alpha vs alpha-blended ellipses: mean difference {np.mean(errors):.2f}, "
+          f"{np.mean(errors > 2) * 100:.1f}% of pixels differ by more than 2 (ring edges)")
+
+
+def legacy_waveform_points(y, sr, t, left, width, top, bottom, scale, max_points=200):
+    # make_title_glow's old per-sample loop, kept as the reference for WaveformLine
+    window_duration = 0.1
+    start_sample = max(0, int((t - window_duration/2) * sr))
+    end_sample = min(int((t + window_duration/2) * sr), len(y))
+    segment = y[start_sample:end_sample]
+    max_val = np.max(np.abs(segment))
+    segment = segment / max_val
+    n_points = min(len(segment), max_points)
+    step = len(segment) // n_points if len(segment) > n_points else 1
+    points_above = []
+    points_below = []
+    for i in range(0, len(segment), step):
+        if len(points_above) >= n_points:
+            break
+        x = left + (width * i / len(segment))
+        y_offset = segment[i] * scale
+        points_above.append((x, top + y_offset))
+        points_below.append((x, bottom - y_offset))
+    return points_above, points_below
+
+
+def bench_waveform(frames=240):
+    # Waveform line coordinates and drawing: per-sample loop vs WaveformLine, for a few point counts
+    print(f"\n== Title waveform lines ({TRACK_PATH}, {frames} frames)")
+    y, sr = librosa.load(TRACK_PATH, duration=frames / 24 + 1)
+    times = np.arange(frames) / 24 + 0.5
+    geometry = (960 - 770, 1540, 540 - 180, 540 + 180)
+    canvas = Image.new('RGBA', (1920, 1080))
+    draw = ImageDraw.Draw(canvas)
+
+    for n_points in (200, 1000, 2000):
+        waveform = WaveformLine(y, sr, n_points=n_points)
+
+        def old():
+            for t in times:
+                above, below = legacy_waveform_points(y, sr, t, *geometry, 75.0, max_points=n_points)
+                draw.line(above, fill=(255, 255, 255), width=2)
+                draw.line(below, fill=(255, 255, 255), width=2)
+
+        def new():
+            for t in times:
+                above, below = waveform.lines(t, *geometry, 75.0)
+                draw.line(above, fill=(255, 255, 255), width=2)
+                draw.line(below, fill=(255, 255, 255), width=2)
+
+        old_time, _ = timed(old)
+        new_time, _ = timed(new)
+        error = 0.0
+        for t in times[::10]:
+            old_above, old_below = legacy_waveform_points(y, sr, t, *geometry, 75.0, max_points=n_points)
+            above, below = waveform.lines(t, *geometry, 75.0)
+            error = max(error, np.max(np.abs(np.ravel(old_above) - above)), np.max(np.abs(np.ravel(old_below) - below)))
+        print(f"{n_points:5d} points: loop {frames / old_time:8.1f} fps, vectorized {frames / new_time:8.1f} fps "
+              f"({old_time / new_time:.1f}x), max coordinate difference {error:.1e} px")
+
+
+def tint_full(img, color):
+    # test.py's old glow recolouring on a full frame
+    data = np.array(img)
+    data[data[:, :, 3] > 0, :3] = color
+    return Image.fromarray(data)
+
+
+def bench_layers(size=(1280, 720)):
+    # Full-frame canvases vs bounding-box layers for the overlays that use them
+    print(f"\n== Sparse layers vs full-frame canvases ({size[0]}x{size[1]})")
+    font = bench_font(80)
+    measure = ImageDraw.Draw(Image.new('RGBA', (1, 1)))
+    left, top, right, bottom = measure.textbbox((0, 0), TITLE, font=font)
+    x, y = (size[0] - (right - left)) // 2, (size[1] - (bottom - top)) // 2
+    center = (x + (right - left) // 2, y + (bottom - top) // 2)
+    base = Image.new('RGBA', size, (20, 20, 40, 255))
+
+    def full_text():
+        img = Image.new('RGBA', size, (0, 0, 0, 0))
+        ImageDraw.Draw(img).text((x, y), TITLE, fill=(255, 255, 255, 100), font=font)
+        return img
+
+    cases = {
+        # visualizer3.py Particle Rings / 3D Wireframe title glow
+        "text glow (blur 10)": (
+            lambda: Image.alpha_composite(base, gaussian_blur(full_text(), 10)),
+            lambda: Layer.text((x, y), TITLE, fill=(255, 255, 255, 100), font=font).blur(10)
+                         .composite_onto(base.copy())),
+        # test.py Rotating Text
+        "rotated title": (
+            lambda: Image.alpha_composite(base, full_text().rotate(12, resample=Image.BICUBIC, center=center)),
+            lambda: Layer.text((x, y), TITLE, fill=(255, 255, 255, 100), font=font).rotate(12, center)
+                         .composite_onto(base.copy())),
+        # test.py Soft Glow
+        "tinted glow (blur 10)": (
+            lambda: Image.alpha_composite(base, tint_full(gaussian_blur(full_text(), 10), (0, 100, 255))),
+            lambda: Layer.text((x, y), TITLE, fill=(255, 255, 255, 100), font=font).blur(10).tint((0, 100, 255))
+                         .composite_onto(base.copy())),
+    }
+    for name, (full, sparse) in cases.items():
+        full_time, full_frame = timed(full, repeat=5)
+        sparse_time, sparse_frame = timed(sparse, repeat=5)
+        error = int(np.max(np.abs(np.asarray(full_frame, dtype=np.int16) - np.asarray(sparse_frame))))
+        print(f"{name:<22} full frame {full_time * 1000:6.1f} ms, layer {sparse_time * 1000:6.1f} ms "
+              f"({full_time / sparse_time:.1f}x), max pixel difference {error}")
+
+
+def bench_background(height=1188, brightness=0.6):
+    # Precomputed blur levels blended per frame vs blurring, dimming and resizing the
+    # cover every frame, across the 2-5 blur range the scripts drive from energy
+    if os.path.exists(IMAGE_PATH):
+        cover = Image.open(IMAGE_PATH).convert('RGB')
+    else:
+        rng = np.random.default_rng(0)
+        cover = Image.fromarray(rng.integers(0, 256, (270, 270, 3), dtype=np.uint8)).resize((1080, 1080))
+    print(f"\n== Background: precomputed blur levels vs per-frame filtering ({cover.width}x{cover.height})")
+
+    def per_frame(radius):
+        img = gaussian_blur(cover, radius)
+        img = ImageEnhance.Brightness(img).enhance(brightness)
+        return np.array(img.resize(engine.size, Image.LANCZOS))
+
+    start = time.perf_counter()
+    engine = BlurredBackground(cover, height, brightness=brightness)
+    setup = time.perf_counter() - start
+    print(f"levels {', '.join(f'{r:g}' for r in engine.radii)} at {engine.size[0]}x{engine.size[1]}: "
+          f"{setup * 1000:.0f} ms to build, {engine.nbytes / 2 ** 20:.1f} MiB")
+
+    radii = np.linspace(2.0, 5.0, 13)
+    filter_time, _ = timed(lambda: [per_frame(r) for r in radii], repeat=1)
+    blend_time, _ = timed(lambda: [engine.render(r) for r in radii])
+    print(f"per-frame filter {len(radii) / filter_time:7.1f} fps, blended levels {len(radii) / blend_time:7.1f} fps "
+          f"({filter_time / blend_time:.0f}x)")
+
+    worst_level, worst_between, mean_between = 0, 0, []
+    for radius in radii:
+        diff = np.abs(per_frame(radius).astype(np.int16) - engine.render(radius))
+        if radius in engine.radii:
+            worst_level = max(worst_level, int(diff.max()))
+        else:
+            worst_between = max(worst_between, int(diff.max()))
+            mean_between.append(float(diff.mean()))
+    print(f"max pixel difference at a level {worst_level}, between levels {worst_between} "
+          f"(mean {np.mean(mean_between):.2f})")
+
+
+def bench_static(frames=48, size=(1920, 1080)):
+    # The scripts' frame graph with its time-invariant parts folded in once (cover
+    # opacity over black and its placement, the title raster) vs evaluating them
+    # every frame through moviepy's ColorClip/set_position/set_opacity chain
+    print(f"\n== Static folding: background and title work hoisted out of the frame loop ({size[0]}x{size[1]})")
+    if os.path.exists(IMAGE_PATH):
+        cover = Image.open(IMAGE_PATH).convert('RGB')
+    else:
+        rng = np.random.default_rng(0)
+        cover = Image.fromarray(rng.integers(0, 256, (270, 270, 3), dtype=np.uint8)).resize((1080, 1080))
+    radii = 2 + 3 * np.abs(np.sin(np.arange(frames) * 0.7))
+    duration = frames / 24.0
+    radius_at = lambda t: radii[min(int(t * 24), frames - 1)]
+    bar = ColorClip(size=(size[0], 20), color=(255, 255, 255)).set_duration(duration).set_position((0, size[1] - 20))
+
+    unfolded = BlurredBackground(cover, size[1] * 1.1, brightness=0.6)
+    folded = BlurredBackground(cover, size[1] * 1.1, brightness=0.6, opacity=0.8, frame_size=size)
+    per_frame = CompositeVideoClip([
+        ColorClip(size=size, color=(0, 0, 0)).set_duration(duration),
+        VideoClip(make_frame=lambda t: unfolded.render(radius_at(t)), duration=duration)
+        .set_position('center').set_opacity(0.8),
+        bar,
+    ])
+    hoisted = CompositeVideoClip([VideoClip(make_frame=lambda t: folded.render(radius_at(t)), duration=duration), bar],
+                                 use_bgclip=True)
+    times = np.arange(frames) / 24.0
+    per_frame_time, _ = timed(lambda: [per_frame.get_frame(t) for t in times], repeat=1)
+    hoisted_time, _ = timed(lambda: [hoisted.get_frame(t) for t in times], repeat=1)
+    error = max(int(np.max(np.abs(per_frame.get_frame(t).astype(np.int16) - hoisted.get_frame(t)))) for t in times)
+    print(f"background  per frame {frames / per_frame_time:7.1f} fps, folded {frames / hoisted_time:7.1f} fps "
+          f"({per_frame_time / hoisted_time:.1f}x), max pixel difference {error}")
+
+    clip = title_clip(TITLE)
+    title = script_title(TITLE)
+    white = [(255, 255, 255)] * 3
+    cache = GlowCache()
+
+    def per_frame_title():
+        return TitleRaster(clip.get_frame(0), mask=clip.mask.get_frame(0), pad=GLOW_PAD)
+
+    per_frame_time, _ = timed(lambda: [render_title_glow(per_frame_title(), 1.5, 8.0, white, cache=cache)
+                                       for _ in range(frames)])
+    hoisted_time, _ = timed(lambda: [render_title_glow(title, 1.5, 8.0, white, cache=cache) for _ in range(frames)])
+    error = int(np.max(np.abs(np.array(render_title_glow(per_frame_title(), 1.5, 8.0, white), dtype=np.int16)
+                              - np.array(render_title_glow(title, 1.5, 8.0, white)))))
+    print(f"title glow  per frame {frames / per_frame_time:7.1f} fps, raster once {frames / hoisted_time:7.1f} fps "
+          f"({per_frame_time / hoisted_time:.1f}x, cached layers), max pixel difference {error}")
+
+
+def script_layers(size, frames):
+    # The layer list script2.py composites: full-frame background, the ring glow
+    # layer, the per-frame title with its static mask, a plain title and the progress bar
+    w, h = size
+    duration = frames / 24.0
+    folded = BlurredBackground(Image.fromarray(np.random.default_rng(0).integers(0, 256, (270, 270, 3), dtype=np.uint8))
+                               .resize((1080, 1080)), h * 1.1, brightness=0.6, opacity=0.8, frame_size=size)
+    background = VideoClip(make_frame=lambda t: folded.render(2 + 3 * abs(np.sin(t))), duration=duration)
+
+    box = (w // 2 - 352, h // 2 - 352, w // 2 + 353, h // 2 + 353)
+    glow = RadialGlow((box[2] - box[0], box[3] - box[1]))
+    glow_clip = layer_clip(lambda t: Layer(Image.fromarray(glow.render(220 + 80 * abs(np.sin(t)), 0.5, (80, 160, 255)),
+                                                           'RGBA'), box[:2]), box, duration)
+
+    image = title_raster(TITLE)
+    title_mask = ImageClip(image[:, :, 3] / 255.0, ismask=True).set_duration(duration)
+    title = (ImageClip(np.ascontiguousarray(image[:, :, :3])).set_duration(duration).set_mask(title_mask)
+             .fl(lambda gf, t: np.array(Image.fromarray(gf(t)).point(lambda v: v * (0.8 + 0.2 * np.cos(t)))))
+             .set_position('center'))
+    plain = (ImageClip(np.ascontiguousarray(image[:, :, :3])).set_duration(duration).set_mask(title_mask)
+             .set_position('center'))
+    progress = VideoClip(make_frame=lambda t: np.full((20, w, 3), 255 if t > 0.5 else 0, dtype=np.uint8),
+                         duration=duration).set_position(('center', h - 20))
+    return [background, glow_clip, title, plain, progress]
+
+
+def bench_compositor(size=(1920, 1080), frames=48):
+    # In-place fixed-point compositor vs CompositeVideoClip on script2.py's layer list
+    print(f"\n== Compositor: in-place fixed point vs CompositeVideoClip ({size[0]}x{size[1]}, 5 layers)")
+    layers = script_layers(size, frames)
+    times = np.arange(frames) / 24.0
+    results = {}
+    for name, make in (("CompositeVideoClip", lambda: CompositeVideoClip(layers, use_bgclip=True)),
+                       ("compositor", lambda: composite_clip(layers, use_bgclip=True))):
+        video = make()
+        video.get_frame(0)
+        elapsed, _ = timed(lambda: [video.get_frame(t) for t in times], repeat=1)
+
+        # Memory allocated while rendering one frame, beyond what's held between frames
+        tracemalloc.start()
+        peaks = []
+        for t in times[:8]:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            video.get_frame(t)
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+        tracemalloc.stop()
+        results[name] = (elapsed, max(peaks), [np.array(video.get_frame(t), dtype=np.int16) for t in times[::6]])
+        print(f"{name:<20} {frames / elapsed:7.1f} fps, {max(peaks) / 2 ** 20:6.1f} MiB allocated per frame (layers included)")
+    reference, composited = results["CompositeVideoClip"][2], results["compositor"][2]
+    error = max(int(np.max(np.abs(a - b))) for a, b in zip(reference, composited))
+    print(f"speedup {results['CompositeVideoClip'][0] / results['compositor'][0]:.1f}x, "
+          f"max pixel difference {error} (moviepy truncates float blends, the compositor is exact)")
+
+
+def visualizer_frame(i, size=(1280, 720)):
+    # Stand-in for a visualizer3.py frame: darkened cover plus moving shapes
+    img = Image.new('RGB', size, (10, 10, 30))
+    draw = ImageDraw.Draw(img)
+    for k in range(40):
+        x = (i * 7 + k * 131) % size[0]
+        y = (k * 53 + int(40 * np.sin(i / 10 + k))) % size[1]
+        draw.ellipse([x - 20, y - 20, x + 20, y + 20], fill=((k * 37) % 256, (i * 5) % 256, 200))
+    return img
+
+
+def bench_frame_writer(frames=240, size=(1280, 720), fps=24):
+    # Streaming raw frames into ffmpeg vs visualizer3.py's old JPEG-per-frame path
+    # (temp JPEGs, one ImageClip per frame in a CompositeVideoClip, write_videofile)
+    print(f"\n== Frame writer: ffmpeg pipe vs JPEG frames + CompositeVideoClip ({frames} frames, {size[0]}x{size[1]})")
+    work_dir = tempfile.mkdtemp()
+    try:
+        start = time.perf_counter()
+        paths = []
+        for i in range(frames):
+            path = os.path.join(work_dir, f"frame_{i:05d}.jpg")
+            visualizer_frame(i, size).save(path, quality=95)
+            paths.append(path)
+        clips = [ColorClip(size=size, color=(0, 0, 0), duration=frames / fps)]
+        clips += [ImageClip(path).set_duration(1 / fps).set_start(i / fps) for i, path in enumerate(paths)]
+        old_output = os.path.join(work_dir, "jpeg.mp4")
+        CompositeVideoClip(clips).write_videofile(old_output, fps=fps, codec='libx264', audio=False, logger=None)
+        old_time = time.perf_counter() - start
+        old_disk = sum(os.path.getsize(os.path.join(work_dir, name)) for name in os.listdir(work_dir))
+
+        start = time.perf_counter()
+        new_output = os.path.join(work_dir, "pipe.mp4")
+        with FrameWriter(new_output, size, fps) as writer:
+            for i in range(frames):
+                writer.write(visualizer_frame(i, size))
+        new_time = time.perf_counter() - start
+        new_disk = os.path.getsize(new_output)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"JPEG frames + composite: {old_time:6.1f} s ({frames / old_time:5.1f} fps), "
+          f"peak disk {old_disk / 2 ** 20:7.1f} MiB")
+    print(f"ffmpeg pipe:             {new_time:6.1f} s ({frames / new_time:5.1f} fps), "
+          f"peak disk {new_disk / 2 ** 20:7.1f} MiB (output only)")
+    print(f"speedup {old_time / new_time:.1f}x; temp disk grows with song length on the old path "
+          f"(~{(old_disk - new_disk) / frames / 1024:.0f} KiB per frame)")
+
+
+def bench_segments(segments=3, fps=24, segment_duration=2, size=(640, 360)):
+    # Flat frame table vs test2.py's nested CompositeVideoClip per segment, with the
+    # half-second "Next Effect..." transition over the end of each segment. Kept small:
+    # the nested clips hold every decoded frame and a background per level in memory.
+    print(f"\n== Segment assembly: frame table vs nested CompositeVideoClip ({segments} x {segment_duration} s segments)")
+    work_dir = tempfile.mkdtemp()
+    try:
+        def save_frames(prefix, count, offset):
+            paths = []
+            for i in range(count):
+                paths.append(os.path.join(work_dir, f"{prefix}_{i:04d}.jpg"))
+                visualizer_frame(offset + i, size).save(paths[-1], quality=95)
+            return paths
+        segment_frames = [save_frames(f"effect_{k}", segment_duration * fps, k * 1000) for k in range(segments)]
+        transition = save_frames("transition", fps // 2, 99000)
+        layout = []
+        for k in range(segments):
+            layout.append((segment_frames[k], k * segment_duration, segment_duration))
+            if k < segments - 1:
+                layout.append((transition, (k + 1) * segment_duration - 0.5, 0.5))
+        duration = segments * segment_duration
+
+        start = time.perf_counter()
+        clips = [ColorClip(size=size, color=(0, 0, 0), duration=duration)]
+        for frames, segment_start, segment_length in layout:
+            segment_clip = ImageClip(frames[0]).set_duration(1 / fps)
+            for j in range(1, len(frames)):
+                segment_clip = CompositeVideoClip([segment_clip, ImageClip(frames[j]).set_duration(1 / fps)
+                                                   .set_start(j / fps)])
+            clips.append(segment_clip.set_duration(segment_length).set_start(segment_start))
+        nested = CompositeVideoClip(clips)
+        nested_build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        table = SegmentTimeline(duration, fps, size)
+        for frames, segment_start, segment_length in layout:
+            table.add_segment(frames, segment_start, segment_length)
+        table_build = time.perf_counter() - start
+
+        sample = list(range(0, table.n_frames, 5))
+        nested_time, nested_frames = timed(lambda: [nested.get_frame(i / fps) for i in sample], repeat=1)
+        table_time, table_frames = timed(lambda: [np.asarray(table.frame(i)) for i in sample], repeat=1)
+        differing = sum(not np.array_equal(a, b) for a, b in zip(nested_frames, table_frames))
+        print(f"build: nested {nested_build * 1000:.0f} ms, table {table_build * 1000:.1f} ms")
+        print(f"frame lookup + decode: nested {len(sample) / nested_time:7.1f} fps, "
+              f"table {len(sample) / table_time:7.1f} fps ({nested_time / table_time:.0f}x)")
+        print(f"{differing} of {len(sample)} sampled frames differ: the nested clips compare float start times, "
+              f"so some frames repeat the previous source frame and skip one")
+
+        table.cached = (None, None)
+        assemble_time, _ = timed(lambda: [table.frame(i) for i in range(table.n_frames)], repeat=1)
+        write_time, _ = timed(lambda: table.write(os.path.join(work_dir, "table.mp4")), repeat=1)
+        print(f"writing {table.n_frames} frames: {write_time:.1f} s, of which frame lookup and decode "
+              f"{assemble_time:.1f} s ({assemble_time / write_time * 100:.0f}%); the rest is the encoder")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def glow_frame(i, size=(1280, 720)):
+    # Heavier stand-in for a visualizer3.py frame: the shapes plus a blurred glow pass
+    img = visualizer_frame(i, size)
+    return Image.blend(img, gaussian_blur(img, 12), 0.5)
+
+
+def bench_render_workers(frames=96, size=(1280, 720)):
+    # Frames rendered on RENDER_WORKERS-style process pools, in order, against one
+    # process. Render throughput only; the encoder runs alongside in the real script.
+    cores = os.cpu_count() or 1
+    print(f"\n== Frame rendering: process pool scaling ({frames} frames, {size[0]}x{size[1]}, {cores} cores)")
+    counts = sorted({1, cores} | {2 ** k for k in range(1, cores.bit_length()) if 2 ** k < cores} | {2})
+    base_time, base_frames = timed(lambda: [np.asarray(glow_frame(i, size)) for i in range(frames)], repeat=1)
+    print(f"{'workers':>7}  {'fps':>7}  {'speedup':>7}  {'efficiency':>10}")
+    print(f"{'-':>7}  {frames / base_time:7.1f}  {'1.00x':>7}  {'(in-process loop)':>10}")
+    for workers in counts:
+        elapsed, rendered = timed(lambda: list(render_frames(lambda i: glow_frame(i, size), frames, workers)), repeat=1)
+        if any(not np.array_equal(a, np.asarray(b)) for a, b in zip(base_frames, rendered)):
+            print(f"{workers} workers: frames differ from the in-process loop")
+            sys.exit(1)
+        speedup = base_time / elapsed
+        print(f"{workers:>7}  {frames / elapsed:7.1f}  {speedup:6.2f}x  {speedup / min(workers, cores) * 100:9.0f}%")
+    if cores == 1:
+        print("only one core here: more workers than cores just measure the cost of shipping frames back")
+
+
+def bench_frame_rng(frames=240, draws=1500):
+    # Per-frame Philox streams vs the global random module for Color Storm's particle
+    # radii (5 clusters x 300 per frame): cost per frame and order independence
+    print(f"\n== Frame random streams: per-frame Philox vs global random ({frames} frames x {draws} draws)")
+    def global_random(order):
+        random.seed(0)
+        return {i: [random.uniform(0, 150) for _ in range(draws)] for i in order}
+    def per_frame(order):
+        return {i: frame_rng("Color Storm", i).uniform(0, 150, draws).tolist() for i in order}
+    forward, backward = list(range(frames)), list(range(frames))[::-1]
+    old_time, old_forward = timed(lambda: global_random(forward))
+    new_time, new_forward = timed(lambda: per_frame(forward))
+    old_same = sum(old_forward[i] == draws_ for i, draws_ in global_random(backward).items())
+    new_same = sum(new_forward[i] == draws_ for i, draws_ in per_frame(backward).items())
+    print(f"global random: {old_time / frames * 1e6:6.0f} us per frame, "
+          f"{old_same}/{frames} frames the same when rendered in reverse")
+    print(f"frame_rng:     {new_time / frames * 1e6:6.0f} us per frame, "
+          f"{new_same}/{frames} frames the same when rendered in reverse")
+    if new_same != frames:
+        sys.exit(1)
+
+
+def decoded_frame_hashes(path):
+    # Per-frame checksums of a video's decoded frames
+    result = subprocess.run([get_setting("FFMPEG_BINARY"), "-loglevel", "error", "-i", path, "-map", "0:v",
+                             "-f", "framemd5", "-"], capture_output=True, text=True)
+    return [line.split(",")[-1].strip() for line in result.stdout.splitlines() if not line.startswith("#")]
+
+
+def bench_segmented(size=(1920, 1080), seconds=12, fps=24):
+    # Time ranges rendered and encoded in parallel and joined with the concat demuxer,
+    # against one encode, on script2.py's layer list
+    cores = os.cpu_count() or 1
+    frames = seconds * fps
+    print(f"\n== Segmented encode: parallel time ranges vs one encode ({frames} frames, {size[0]}x{size[1]}, {cores} cores)")
+    video = composite_clip(script_layers(size, frames), use_bgclip=True)
+    render = lambda i: video.get_frame(i / fps)
+    work_dir = tempfile.mkdtemp()
+    try:
+        single_path = os.path.join(work_dir, "single.mp4")
+        single_time, _ = timed(lambda: write_segmented(render, frames, single_path, size, fps, segments=1), repeat=1)
+        single_hashes = decoded_frame_hashes(single_path)
+        print(f"{'segments':>8}  {'time':>7}  {'speedup':>7}  {'frames':>6}  {'bit-identical':>13}")
+        print(f"{1:>8}  {single_time:6.1f}s  {'1.00x':>7}  {len(single_hashes):>6}")
+        for segments in sorted({2, cores} - {1}):
+            path = os.path.join(work_dir, f"segments_{segments}.mp4")
+            elapsed, _ = timed(lambda: write_segmented(render, frames, path, size, fps, segments=segments), repeat=1)
+            hashes = decoded_frame_hashes(path)
+            same = sum(a == b for a, b in zip(single_hashes, hashes))
+            print(f"{segments:>8}  {elapsed:6.1f}s  {single_time / elapsed:6.2f}x  {len(hashes):>6}  {same:>6}/{len(single_hashes)}")
+            if len(hashes) != frames:
+                sys.exit(1)
+        print("segments are encoded independently, so rate control makes slightly different choices "
+              "and some decoded frames differ in the last bits")
+        if cores == 1:
+            print("only one core here: segments share it, so this shows the split and join overhead")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+BENCHMARKS = {
+    "analysis": bench_analysis,
+    "profiles": bench_profiles,
+    "beats": bench_beats,
+    "title": bench_title,
+    "glow_cache": bench_glow_cache,
+    "blur": bench_blur,
+    "radial_glow": bench_radial_glow,
+    "waveform": bench_waveform,
+    "layers": bench_layers,
+    "background": bench_background,
+    "static": bench_static,
+    "compositor": bench_compositor,
+    "frame_writer": bench_frame_writer,
+    "segments": bench_segments,
+    "render_workers": bench_render_workers,
+    "frame_rng": bench_frame_rng,
+    "segmented": bench_segmented,
+}
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark: {name} (choose from {', '.join(BENCHMARKS)})")
+            sys.exit(1)
+        BENCHMARKS[name]()
@@ -0,0 +1,137 @@
+import numpy as np
+from moviepy.editor import VideoClip
+
+# In-place frame compositor, a drop-in for CompositeVideoClip over the scripts'
+# clip lists. moviepy copies the whole frame for every layer it blits, turns each
+# mask into float64 arrays and blends in floating point; here every layer is
+# blended straight into one preallocated output frame, only over the rectangle
+# it covers, in uint16 fixed point:
+#
+#   out = (colour * alpha + out * (255 - alpha)) / 255
+#
+# with colour * alpha being the layer's premultiplied colour. Alpha comes from
+# the clip's mask (converted to 0-255 once for static masks such as TextClip's)
+# or straight from the RGBA frames of layers.rgba_video_clip, skipping the float
+# mask entirely. Positions, start/end times and a background clip work as in
+# CompositeVideoClip.
+
+
+def _position(clip, ct, frame_size, size):
+    # Top-left corner of the clip in the frame, as moviepy's blit_on works it out
+    pos = clip.pos(ct)
+    if isinstance(pos, str):
+        pos = {'center': ['center', 'center'], 'left': ['left', 'center'], 'right': ['right', 'center'],
+               'top': ['center', 'top'], 'bottom': ['center', 'bottom']}[pos]
+    else:
+        pos = list(pos)
+    if clip.relative_pos:
+        for i, dim in enumerate(frame_size):
+            if not isinstance(pos[i], str):
+                pos[i] = dim * pos[i]
+    if isinstance(pos[0], str):
+        pos[0] = {'left': 0, 'center': (frame_size[0] - size[0]) / 2, 'right': frame_size[0] - size[0]}[pos[0]]
+    if isinstance(pos[1], str):
+        pos[1] = {'top': 0, 'center': (frame_size[1] - size[1]) / 2, 'bottom': frame_size[1] - size[1]}[pos[1]]
+    return int(pos[0]), int(pos[1])
+
+
+def _fit(img, shape):
+    # Crop or pad (with 1s, like VideoClip.fill_array) a frame to its mask's shape
+    img = img[:shape[0], :shape[1]]
+    if img.shape[:2] != tuple(shape[:2]):
+        padded = np.ones(tuple(shape[:2]) + img.shape[2:], dtype=img.dtype)
+        padded[:img.shape[0], :img.shape[1]] = img
+        img = padded
+    return img
+
+
+class Compositor:
+
+    def __init__(self, clips, size=None, bg_color=(0, 0, 0), use_bgclip=False):
+        self.size = tuple(size or clips[0].size)
+        self.bg_color = bg_color
+        self.bg = clips[0] if use_bgclip else None
+        self.clips = clips[1:] if use_bgclip else list(clips)
+        ends = [c.end for c in self.clips]
+        self.duration = max(ends) if ends and None not in ends else (self.bg.duration if self.bg else None)
+
+        # Output frame and blend scratch planes, reused for every layer of every frame
+        w, h = self.size
+        self.frame = np.empty((h, w, 3), dtype=np.uint8)
+        self.scratch = np.empty((4, h * w), dtype=np.uint16)
+
+        # Last float mask seen per clip and its 0-255 alpha, so masks that don't change
+        # (the same array every frame) are only converted once
+        self.masks = [(None, None)] * len(self.clips)
+
+    def alpha(self, i, mask):
+        source, alpha = self.masks[i]
+        if mask is not source:
+            alpha = np.rint(mask * 255.0).astype(np.uint8)
+            self.masks[i] = (mask, alpha)
+        return alpha
+
+    def blend(self, img, alpha, x, y):
+        # Blend img (uint8 RGB) with alpha (uint8 h x w, or None for opaque)
+        # into the frame at (x, y), over the part that lands inside the frame
+        h, w = img.shape[:2]
+        left, top = max(0, -x), max(0, -y)
+        right, bottom = min(w, self.size[0] - x), min(h, self.size[1] - y)
+        if left >= right or top >= bottom:
+            return
+        out = self.frame[y + top:y + bottom, x + left:x + right]
+        img = img[top:bottom, left:right, :3]
+        if alpha is None:
+            np.copyto(out, img)
+            return
+        alpha = alpha[top:bottom, left:right]
+        # One channel at a time: NumPy is much faster on whole planes than on
+        # 3-element pixel rows. Scratch planes are contiguous views of the buffers.
+        n = (bottom - top) * (right - left)
+        acc, tmp, weight, inverse = (plane[:n].reshape(alpha.shape) for plane in self.scratch)
+        np.copyto(weight, alpha)
+        np.subtract(255, weight, out=inverse)
+        for c in range(3):
+            np.copyto(acc, img[:, :, c])
+            np.multiply(acc, weight, out=acc)
+            np.copyto(tmp, out[:, :, c])
+            np.multiply(tmp, inverse, out=tmp)
+            np.add(acc, tmp, out=acc)
+            # Exact floor(x / 255) for 0 <= x <= 65025 without a division
+            np.right_shift(acc, 8, out=tmp)
+            np.add(acc, tmp, out=acc)
+            np.add(acc, 1, out=acc)
+            np.right_shift(acc, 8, out=acc)
+            np.copyto(out[:, :, c], acc, casting="unsafe")
+
+    def render(self, t):
+        # The composited RGB frame at t. The returned array is reused by the next call.
+        if self.bg is not None:
+            np.copyto(self.frame, self.bg.get_frame(t))
+        else:
+            self.frame[:] = self.bg_color
+        for i, clip in enumerate(self.clips):
+            if not clip.is_playing(t):
+                continue
+            ct = t - clip.start
+            rgba_frame = getattr(clip, "rgba_frame", None)
+            if rgba_frame is not None:
+                rgba = rgba_frame(ct)
+                img, alpha = rgba, rgba[:, :, 3]
+            else:
+                img = clip.get_frame(ct)
+                alpha = None
+                if clip.mask is not None:
+                    mask = clip.mask.get_frame(ct)
+                    if img.shape[:2] != mask.shape[:2]:
+                        img = _fit(img, mask.shape)
+                    alpha = self.alpha(i, mask)
+            x, y = _position(clip, ct, self.size, (img.shape[1], img.shape[0]))
+            self.blend(img, alpha, x, y)
+        return self.frame
+
+
+def composite_clip(clips, size=None, bg_color=(0, 0, 0), use_bgclip=False):
+    # Same arguments as CompositeVideoClip (without mask output)
+    compositor = Compositor(clips, size=size, bg_color=bg_color, use_bgclip=use_bgclip)
+    return VideoClip(make_frame=compositor.render, duration=compositor.duration)
@@ -0,0 +1,117 @@
+import os
+import time
+import shutil
+import tempfile
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from video_writer import FrameWriter, concat_videos
+from settings import KEYFRAME_SECONDS, RENDER_CHUNK, RENDER_SEGMENTS, RENDER_WORKERS
+
+# Renders independent frames on a pool of worker processes and hands them back in
+# frame order, ready for the encoder. Workers are forked from the rendering
+# script once its static assets (analysis timeline, cover, fonts, style timing)
+# are set up, so each worker shares them as they are instead of loading or
+# receiving them again; only frame indices go out and finished frames come back.
+# Frames are rendered in chunks of consecutive indices, and only a few chunks per
+# worker are in flight at once, so a slow encoder holds up rendering rather than
+# letting finished frames pile up in memory.
+#
+# With a single encoder, the encode itself becomes the limit once rendering is
+# spread over enough cores. write_segmented splits the video into time ranges
+# that start on keyframes and renders and encodes each range in its own forked
+# process, then joins the pieces with ffmpeg's concat demuxer (no re-encode) and
+# muxes in the audio once.
+
+# Frame function of the pool being set up; forked workers inherit it
+_render = None
+
+
+def _render_chunk(start, stop):
+    # Runs in a worker. Arrays pickle as one buffer, PIL images as much more.
+    return [np.asarray(_render(i)) for i in range(start, stop)]
+
+
+def render_frames(render, total_frames, workers=None, chunk=None):
+    # Yields render(0), ..., render(total_frames - 1) in order. `render` takes a frame
+    # index and returns a PIL image or uint8 array. Needs the fork start method to
+    # share the caller's state; elsewhere frames are rendered in-process.
+    global _render
+    workers = max(1, min(workers or RENDER_WORKERS, total_frames))
+    chunk = max(1, chunk or RENDER_CHUNK)
+    if workers == 1 or "fork" not in multiprocessing.get_all_start_methods():
+        for i in range(total_frames):
+            yield render(i)
+        return
+
+    _render = render
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        pending = deque()
+        starts = iter(range(0, total_frames, chunk))
+        for start in starts:
+            pending.append(executor.submit(_render_chunk, start, min(start + chunk, total_frames)))
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            frames = pending.popleft().result()
+            start = next(starts, None)
+            if start is not None:
+                pending.append(executor.submit(_render_chunk, start, min(start + chunk, total_frames)))
+            yield from frames
+
+
+def segment_ranges(total_frames, segments, gop):
+    # Split frames 0..total_frames-1 into up to `segments` ranges of whole GOPs
+    # (keyframe intervals), as evenly as whole GOPs allow
+    gops = -(-total_frames // gop)
+    segments = max(1, min(segments, gops))
+    bounds = [min(total_frames, (k * gops // segments) * gop) for k in range(segments + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _encode_segment(start, stop, path, size, fps, codec, params):
+    # Runs in a worker: renders and encodes one range of frames
+    began = time.time()
+    with FrameWriter(path, size, fps, codec=codec, ffmpeg_params=params) as writer:
+        for i in range(start, stop):
+            writer.write(_render(i))
+    return time.time() - began
+
+
+def write_segmented(render, total_frames, path, size, fps, segments=None, audio_path=None,
+                    audio_duration=None, codec="libx264"):
+    # Writes render(0), ..., render(total_frames - 1) to `path` as FrameWriter would,
+    # encoding up to `segments` (default RENDER_SEGMENTS) time ranges in parallel.
+    # Every segment keeps a keyframe every KEYFRAME_SECONDS and starts on one, so
+    # the joined stream has the same keyframe spacing as a single encode.
+    global _render
+    gop = max(1, int(round(fps * KEYFRAME_SECONDS)))
+    params = ["-g", str(gop)]
+    ranges = segment_ranges(total_frames, segments or RENDER_SEGMENTS, gop)
+    if len(ranges) == 1 or "fork" not in multiprocessing.get_all_start_methods():
+        with FrameWriter(path, size, fps, codec=codec, audio_path=audio_path,
+                         audio_duration=audio_duration, ffmpeg_params=params) as writer:
+            for i in range(total_frames):
+                writer.write(render(i))
+        return
+
+    # Share the cores between the segments' encoders rather than each starting a thread per core
+    params += ["-threads", str(max(1, (os.cpu_count() or 1) // len(ranges)))]
+    print(f"Encoding {total_frames} frames as {len(ranges)} segments in parallel")
+    work_dir = tempfile.mkdtemp()
+    try:
+        paths = [os.path.join(work_dir, f"segment_{k:04d}.mp4") for k in range(len(ranges))]
+        _render = render
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=len(ranges), mp_context=context) as executor:
+            futures = [executor.submit(_encode_segment, start, stop, segment_path, size, fps, codec, params)
+                       for (start, stop), segment_path in zip(ranges, paths)]
+            for k, ((start, stop), future) in enumerate(zip(ranges, futures)):
+                print(f"Segment {k + 1}/{len(ranges)} (frames {start}-{stop - 1}) "
+                      f"encoded in {future.result():.1f} seconds")
+        print(f"Joining segments into {path}...")
+        concat_videos(paths, path, audio_path=audio_path, audio_duration=audio_duration)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,26 @@
+import zlib
+import numpy as np
+from settings import RENDER_SEED
+
+# Per-frame random streams. Effects that scatter particles or glitches draw from
+# a generator keyed on (seed, style, frame index) instead of the global `random`
+# module, so a frame comes out the same whichever order frames are rendered in,
+# on whichever worker, and whether or not the frames before it were rendered.
+#
+# The generator is Philox, which is counter-based: the seed and style name make
+# up its key, and the frame index goes in the top word of its 256-bit counter.
+# Setting up a frame's stream is just setting the counter (no seeding pass), and
+# streams of different frames can't overlap short of 2**192 draws.
+
+
+def stream_key(name):
+    # Stable across processes and runs, unlike hash() of a str
+    return zlib.crc32(name.encode("utf-8"))
+
+
+def frame_rng(name, frame, seed=None):
+    # numpy Generator for the given style/effect name and frame index
+    seed = RENDER_SEED if seed is None else seed
+    key = np.array([seed & 0xFFFFFFFFFFFFFFFF, stream_key(name)], dtype=np.uint64)
+    counter = np.array([0, 0, 0, frame], dtype=np.uint64)
+    return np.random.Generator(np.random.Philox(counter=counter, key=key))
@@ -0,0 +1,130 @@
+import math
+import numpy as np
+from PIL import Image, ImageDraw
+from moviepy.editor import VideoClip
+from blur import gaussian_blur
+
+# Sparse RGBA layers: pixels for just the region an overlay draws in, plus where
+# that region sits in the frame. Blur, rotate, tint and composite only touch that
+# region, so a centred title costs the same on a 1280x720 frame as on a 4K one.
+# Boxes are (left, top, right, bottom) in frame pixels.
+
+
+def union_box(*boxes):
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+def clip_box(box, size):
+    return (max(box[0], 0), max(box[1], 0), min(box[2], size[0]), min(box[3], size[1]))
+
+
+class Layer:
+
+    def __init__(self, image, offset=(0, 0)):
+        self.image = image if image.mode == "RGBA" else image.convert("RGBA")
+        self.offset = (int(offset[0]), int(offset[1]))
+
+    @classmethod
+    def blank(cls, box):
+        return cls(Image.new("RGBA", (box[2] - box[0], box[3] - box[1]), (0, 0, 0, 0)), box[:2])
+
+    @classmethod
+    def text(cls, position, text, fill, font, pad=0):
+        # Just the text's bounding box (plus `pad` clear pixels around it), with the
+        # glyphs exactly where drawing at `position` on a full frame would put them
+        measure = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+        left, top, right, bottom = measure.textbbox(position, text, font=font)
+        layer = cls.blank((left - pad, top - pad, right + pad, bottom + pad))
+        layer.draw().text((position[0] - layer.offset[0], position[1] - layer.offset[1]), text, fill=fill, font=font)
+        return layer
+
+    @property
+    def box(self):
+        return (self.offset[0], self.offset[1],
+                self.offset[0] + self.image.width, self.offset[1] + self.image.height)
+
+    def draw(self):
+        # ImageDraw on the layer's own pixels (coordinates relative to the offset)
+        return ImageDraw.Draw(self.image)
+
+    def padded(self, pad):
+        left, top, right, bottom = self.box
+        layer = Layer.blank((left - pad, top - pad, right + pad, bottom + pad))
+        layer.image.paste(self.image, (pad, pad))
+        return layer
+
+    def blur(self, radius, quality=None):
+        # Grow the region first so the blur has room to spread, as it would on a full frame
+        layer = self.padded(int(math.ceil(3 * float(radius))) + 2)
+        layer.image = gaussian_blur(layer.image, radius, quality)
+        return layer
+
+    def tint(self, color):
+        # Recolour every pixel with any alpha, keeping the alpha
+        data = np.array(self.image)
+        data[data[:, :, 3] > 0, :3] = color
+        return Layer(Image.fromarray(data, "RGBA"), self.offset)
+
+    def rotate(self, angle, center, resample=Image.BICUBIC):
+        # Same pixels as Image.rotate(angle, resample, center=center) on the full
+        # frame: PIL's output-to-input affine map, evaluated over the rotated region only
+        radians = -math.radians(angle % 360.0)
+        a, b = round(math.cos(radians), 15), round(math.sin(radians), 15)
+        d, e = round(-math.sin(radians), 15), round(math.cos(radians), 15)
+        c = a * -center[0] + b * -center[1] + center[0]
+        f = d * -center[0] + e * -center[1] + center[1]
+
+        # PIL leaves output transparent wherever the sample point falls outside the
+        # source, so give the filter a clear border to sample, as a full frame would
+        source = self.padded(3)
+
+        # Output region: the layer's corners mapped forward (the transpose of the
+        # rotation) about the centre, plus room for the filter
+        left, top, right, bottom = source.box
+        rel = np.array([[left, top], [right, top], [left, bottom], [right, bottom]], dtype=np.float64) - center
+        xs = center[0] + a * rel[:, 0] + d * rel[:, 1]
+        ys = center[1] + b * rel[:, 0] + e * rel[:, 1]
+        box = (int(math.floor(xs.min())) - 2, int(math.floor(ys.min())) - 2,
+               int(math.ceil(xs.max())) + 2, int(math.ceil(ys.max())) + 2)
+
+        # The frame-coordinate map, shifted to both regions' own coordinates
+        c_local = a * box[0] + b * box[1] + c - source.offset[0]
+        f_local = d * box[0] + e * box[1] + f - source.offset[1]
+        size = (box[2] - box[0], box[3] - box[1])
+        image = source.image.transform(size, Image.AFFINE, (a, b, c_local, d, e, f_local), resample)
+        return Layer(image, box[:2])
+
+    def composite_onto(self, frame):
+        # Alpha-composite onto an RGBA frame in place, clipped to the frame
+        left, top, right, bottom = clip_box(self.box, frame.size)
+        if left >= right or top >= bottom:
+            return frame
+        source = (left - self.offset[0], top - self.offset[1], right - self.offset[0], bottom - self.offset[1])
+        frame.alpha_composite(self.image, dest=(left, top), source=source)
+        return frame
+
+
+def rgba_video_clip(make_frame, duration):
+    # VideoClip from a function returning RGBA frames: RGB as the clip, alpha as its
+    # mask. moviepy asks for the frame and then the mask at the same t, so the
+    # last frame is kept rather than rendered twice.
+    last = {"t": None, "frame": None}
+
+    def rgba_frame(t):
+        if last["t"] != t:
+            last["t"], last["frame"] = t, make_frame(t)
+        return last["frame"]
+
+    clip = VideoClip(make_frame=lambda t: rgba_frame(t)[:, :, :3], duration=duration)
+    mask = VideoClip(make_frame=lambda t: rgba_frame(t)[:, :, 3] / 255.0, ismask=True, duration=duration)
+    clip = clip.set_mask(mask)
+    # compositor.py reads the RGBA frames directly rather than through the float mask
+    clip.rgba_frame = rgba_frame
+    return clip
+
+
+def layer_clip(make_layer, box, duration):
+    # Clip the size of `box`, placed at its corner, from a function returning a Layer
+    # covering that box each frame (only that region is composited by moviepy)
+    return rgba_video_clip(lambda t: np.asarray(make_layer(t).image), duration).set_position(box[:2])
@@ -1,11 +1,17 @@
 import os
 from dotenv import load_dotenv
-import librosa
 import numpy as np
-from moviepy.editor import AudioFileClip, ImageClip, ColorClip, CompositeVideoClip, TextClip, VideoClip
-from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
+from moviepy.editor import AudioFileClip, TextClip, VideoClip
+from PIL import Image, ImageDraw
 import moviepy.config as mpconf
 import colorsys
+from audio_analysis import BeatIndex, FeatureTimeline, get_analysis_profile
+from audio_ingest import ingest_audio
+from title_effects import GLOW_PAD, GlowCache, RadialGlow, TitleRaster, WaveformLine, render_title_glow
+from background import BlurredBackground
+from layers import Layer, clip_box, layer_clip, rgba_video_clip, union_box
+from compositor import composite_clip
+from frame_pool import RENDER_SEGMENTS, write_segmented
 
 # Set ImageMagick path (adjust this if your setup's different)
 mpconf.change_settings({"IMAGEMAGICK_BINARY": "/opt/homebrew/bin/convert"})
@@ -19,103 +25,45 @@ OUTPUT_PATH = os.getenv("OUTPUT_PATH", "do_the_loftwah.mp4")
 
 print(f"Creating video from {TRACK_PATH} and {IMAGE_PATH}")
 
-# Load audio
-audio = AudioFileClip(TRACK_PATH)
-duration = audio.duration
-y, sr = librosa.load(TRACK_PATH)
+# Load audio once and analyze it for beats, tempo, RMS and spectral features (cached between runs)
+analysis_profile = get_analysis_profile()  # ANALYSIS_PROFILE=fast for quicker drafts
+ingest = ingest_audio(TRACK_PATH, **analysis_profile)
+duration = ingest["duration"]
+analysis = ingest["analysis"]
 print(f"Audio duration: {duration:.2f} seconds")
 
-# Analyze audio for beats and tempo
-tempo, beats = librosa.beat.beat_track(y=y, sr=sr)
-beat_times = librosa.frames_to_time(beats, sr=sr)
+y, sr = analysis["y"], analysis["sr"]
+tempo = analysis["tempo"]
+beat_times = analysis["beat_times"]
+beat_index = BeatIndex(beat_times)
 print(f"Detected tempo: {float(tempo):.2f} BPM with {len(beat_times)} beats")
 
-# Compute RMS for visual effects
-frame_length = 2048
-hop_length = 512
-rms = librosa.feature.rms(y=y, frame_length=frame_length, hop_length=hop_length)[0]
-rms_times = librosa.times_like(rms, sr=sr, hop_length=hop_length)
-min_rms = np.min(rms)
-max_rms = np.max(rms)
-
-# Compute spectral features for more advanced effects
-spectral_centroid = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
-spectral_times = librosa.times_like(spectral_centroid, sr=sr)
+# Resample RMS energy, spectral centroid and beat proximity onto the output frame grid once
+FPS = 24
+timeline = FeatureTimeline(analysis, duration, fps=FPS, beat_index=beat_index)
 
 # Video dimensions
 w_video, h_video = 1920, 1080
 
-# Black background
-background = ColorClip(size=(w_video, h_video), color=(0, 0, 0)).set_duration(duration)
-
-# Load image and make it less prominent
-image_clip = ImageClip(IMAGE_PATH).set_duration(duration)
-
-# Patch the resizer function in moviepy to fix ANTIALIAS issue
-def patched_resizer(image, newsize):
-    pilim = Image.fromarray(image)
-    
-    # Handle if newsize contains floats instead of integers
-    if isinstance(newsize, tuple) and len(newsize) == 2:
-        # When newsize is a tuple of scaling factors
-        h, w = image.shape[:2]
-        if isinstance(newsize[0], (float, np.float64, np.float32)):
-            new_w = int(w * newsize[0])
-            new_h = int(h * newsize[1])
-            newsize = (new_w, new_h)
-    
-    # Ensure newsize contains integers
-    if not isinstance(newsize[0], int):
-        newsize = tuple(int(round(float(x))) for x in newsize)
-    
-    # Use LANCZOS instead of ANTIALIAS (which is deprecated in newer PIL versions)
-    resample_method = getattr(Image, "LANCZOS", getattr(Image.Resampling, "LANCZOS", Image.BICUBIC))
-    
-    # Reverse width and height for PIL's resize (it expects width, height)
-    resized_pil = pilim.resize(newsize[::-1], resample_method)
-    return np.array(resized_pil)
-
-# Monkey patch the resizer function in moviepy
-from moviepy.video.fx.resize import resizer
-import moviepy.video.fx.resize
-moviepy.video.fx.resize.resizer = patched_resizer
+# Cover image, blurred and dimmed at a few radii and already at its final size
+# (slightly larger than the screen, with some room for movement); see BG_BLUR_LEVELS in .env.
+# None of its placement changes over time, so it's folded in once: centred on the
+# black background at 80% opacity for better visibility, cropped to the screen.
+background_image = BlurredBackground(IMAGE_PATH, h_video * 1.1, brightness=0.6, opacity=0.8,
+                                     frame_size=(w_video, h_video), color=(0, 0, 0))
 
 # Apply subtle movement to image
-def process_bg_image(image, t):
-    # Convert PIL image to numpy array, apply blur and reduce opacity
-    img = Image.fromarray(image)
-    
+def process_bg_image(t):
     # Blur amount based on audio energy
-    rms_value = np.interp(t, rms_times, rms)
-    blur_amount = 2 + (rms_value - min_rms) / (max_rms - min_rms) * 3  # Blur between 2 and 5
-    img = img.filter(ImageFilter.GaussianBlur(radius=blur_amount))
-    
-    # Reduce brightness and add a slight tint
-    enhancer = ImageEnhance.Brightness(img)
-    img = enhancer.enhance(0.6)  # Dim the image
-    
-    return np.array(img)
-
-# Apply the image processing
-image_clip = image_clip.fl(lambda gf, t: process_bg_image(gf(t), t))
-
-# Resize the image to fill the screen with some room for movement
-image_clip = image_clip.resize(height=h_video * 1.1)  # Make it slightly larger than the screen
-
-# Subtle position shift based on audio energy for background
-def bg_position(t):
-    # Get audio energy
-    rms_value = np.interp(t, rms_times, rms)
-    energy_factor = (rms_value - min_rms) / (max_rms - min_rms) * 0.5  # Scale to 0-0.5%
-    
-    # Return position as (x, y) tuple with the image centered and slight shift
-    return ('center', 'center')
+    energy_factor = timeline.energy_factor[timeline.index(t)]
+    blur_amount = 2 + energy_factor * 3  # Blur between 2 and 5
+    return background_image.render(blur_amount)
 
-# Set position with subtle movement
-image_clip = image_clip.set_position(bg_position)
+# Full-frame background: the compositor starts every frame from it
+background = VideoClip(make_frame=process_bg_image, duration=duration)
 
-# Make background more visible
-image_clip = image_clip.set_opacity(0.8)  # 80% opacity for better visibility
+# Blurred title glow layers, reused across frames with similar energy (see GLOW_CACHE_* in .env)
+glow_cache = GlowCache()
 
 # Title effects with enhanced waveform response
 def create_title_clip():
@@ -126,47 +74,20 @@ def create_title_clip():
         print(f"Warning: Could not create text clip with specified font. Using default. Error: {e}")
         base_title = TextClip(TITLE, fontsize=90, color='white', kerning=5)
     
-    # Make it last the entire duration
-    base_title = base_title.set_duration(duration)
-    
-    # Position in center
-    base_title = base_title.set_position('center')
+    # The title raster itself never changes; only its glow and scale follow the audio.
+    # TextClip frames are RGB with the text's alpha in the clip's mask, and the raster
+    # gets a clear border so the glow can fade out around the text.
+    title = TitleRaster(base_title.get_frame(0), mask=base_title.mask.get_frame(0), pad=GLOW_PAD)
     
     # Apply glow effects to the title based on audio
-    def title_transform(image, t):
+    def title_transform(t):
         # Get current audio features
-        rms_value = np.interp(t, rms_times, rms)
-        energy_factor = (rms_value - min_rms) / (max_rms - min_rms)
+        frame = timeline.index(t)
+        energy_factor = timeline.energy_factor[frame]
         
         # Check if we're on a beat
-        on_beat = False
-        beat_distance = 1.0
-        for beat_time in beat_times:
-            dist = abs(t - beat_time)
-            if dist < beat_distance:
-                beat_distance = dist
-            if dist < 0.1:  # Within 100ms of a beat
-                on_beat = True
-                break
-        
-        # Convert to PIL image for processing
-        img = Image.fromarray(image)
-        
-        # Pure white for text and glow
-        r, g, b = 255, 255, 255  # WHITE
-        
-        # Create a colored version of the text
-        colored_img = Image.new('RGBA', img.size)
-        for x in range(img.width):
-            for y in range(img.height):
-                pixel = img.getpixel((x, y))
-                if len(pixel) > 3 and pixel[3] > 0:  # If not fully transparent
-                    colored_img.putpixel((x, y), (r, g, b, pixel[3]))
-                else:
-                    colored_img.putpixel((x, y), (0, 0, 0, 0))
-        
-        # Apply glow effect based on audio energy
-        result = Image.new('RGBA', img.size, (0, 0, 0, 0))
+        beat_distance = timeline.beat_distance[frame]
+        on_beat = bool(timeline.on_beat[frame])  # Within 100ms of a beat
         
         # Determine glow intensity based on beat and energy
         if on_beat:
@@ -178,33 +99,8 @@ def create_title_clip():
             glow_strength = 0.5 + (energy_factor * 0.5)
             glow_radius = 2 + energy_factor * 5
         
-        # Create the glow effect with multiple layers
-        for i in range(3):
-            # Different radius for each layer
-            current_radius = glow_radius * (1 - i * 0.3)
-            
-            # WHITE GLOW always
-            layer_r, layer_g, layer_b = 255, 255, 255
-            
-            # Create colored layer
-            glow_layer = Image.new('RGBA', img.size)
-            for x in range(img.width):
-                for y in range(img.height):
-                    pixel = img.getpixel((x, y))
-                    if len(pixel) > 3 and pixel[3] > 0:
-                        alpha = min(255, int(pixel[3] * glow_strength * (1 - i * 0.3)))
-                        glow_layer.putpixel((x, y), (layer_r, layer_g, layer_b, alpha))
-                    else:
-                        glow_layer.putpixel((x, y), (0, 0, 0, 0))
-            
-            # Blur the layer
-            glow_layer = glow_layer.filter(ImageFilter.GaussianBlur(radius=current_radius))
-            
-            # Composite onto result
-            result = Image.alpha_composite(result, glow_layer)
-        
-        # Finally add the sharp colored text on top
-        result = Image.alpha_composite(result, colored_img)
+        # Three WHITE glow layers under the sharp WHITE text
+        result = render_title_glow(title, glow_strength, glow_radius, [(255, 255, 255)] * 3, cache=glow_cache)
         
         # Apply scaling directly to the image (instead of using resize)
         if on_beat:
@@ -212,26 +108,23 @@ def create_title_clip():
             scale_factor = 1.0 + 0.1 * (1.0 - beat_distance * 10) * energy_factor
             if scale_factor > 1.0:
                 # Calculate new dimensions
-                new_width = int(img.width * scale_factor)
-                new_height = int(img.height * scale_factor)
+                new_width = int(title.size[0] * scale_factor)
+                new_height = int(title.size[1] * scale_factor)
                 
                 # Calculate offsets to keep centered
-                offset_x = (new_width - img.width) // 2
-                offset_y = (new_height - img.height) // 2
+                offset_x = (new_width - title.size[0]) // 2
+                offset_y = (new_height - title.size[1]) // 2
                 
                 # Create a new larger image with the scaled result
                 scaled_result = Image.new('RGBA', (new_width, new_height), (0, 0, 0, 0))
                 scaled_result.paste(result, (offset_x, offset_y))
                 result = scaled_result
         
-        # Convert to RGB before returning (this is crucial to avoid alpha channel issues)
-        rgb_result = Image.new('RGB', result.size, (0, 0, 0))
-        rgb_result.paste(result, (0, 0), result)
-        
-        return np.array(rgb_result)
+        # RGBA: the glow's alpha is the clip's mask, so it shows around the text
+        return np.array(result)
     
-    # Apply the transformation
-    return base_title.fl(lambda gf, t: title_transform(gf(t), t))
+    # Apply the transformation for the entire duration, centred
+    return rgba_video_clip(title_transform, duration).set_position('center')
 
 # Progress bar
 def make_progress_frame(t):
@@ -244,114 +137,82 @@ def make_progress_frame(t):
 progress_clip = VideoClip(make_frame=make_progress_frame, duration=duration).set_position(('center', h_video - 20))
 
 # Title glowing effect
+# Center of the screen
+center_x, center_y = w_video // 2, h_video // 2
+
+# Calculate title dimensions (approximate)
+title_width = len(TITLE) * 55  # Rough estimate based on 90px font
+title_height = 120  # Rough estimate
+waveform_top = center_y - title_height - 60
+waveform_bottom = center_y + title_height + 60
+
+# The only part of the frame the glow can reach: the largest ring (radius 350 on a
+# loud beat) and the waveforms swinging up to 100px either side of their lines
+glow_box = clip_box(union_box((center_x - 352, center_y - 352, center_x + 353, center_y + 353),
+                              (center_x - title_width - 2, waveform_top - 102,
+                               center_x + title_width + 3, waveform_bottom + 103)),
+                    (w_video, h_video))
+
+# Distance of every pixel in that region from the centre, for the ring glow behind the title
+radial_glow = RadialGlow((glow_box[2] - glow_box[0], glow_box[3] - glow_box[1]),
+                         center=(center_x - glow_box[0], center_y - glow_box[1]))
+
+# Waveform lines above and below the title (WAVEFORM_POINTS points each)
+waveform = WaveformLine(y, sr)
+
 def make_title_glow(t):
-    # Create a transparent image
-    img = Image.new('RGB', (w_video, h_video), color=(0, 0, 0))
-    draw = ImageDraw.Draw(img)
-    
+    # Layer over glow_box: ring glow and waveforms on a transparent background
     # Get current RMS value for intensity
-    rms_value = np.interp(t, rms_times, rms)
-    energy_factor = (rms_value - min_rms) / (max_rms - min_rms)
+    frame = timeline.index(t)
+    energy_factor = timeline.energy_factor[frame]
     
     # Check if we're on a beat
-    on_beat = False
-    for beat_time in beat_times:
-        if abs(t - beat_time) < 0.1:  # Within 100ms of a beat
-            on_beat = True
-            break
-    
-    # Center of the screen
-    center_x, center_y = w_video // 2, h_video // 2
+    on_beat = bool(timeline.on_beat[frame])  # Within 100ms of a beat
     
     # WHITE glow effect behind the title
     r, g, b = 255, 255, 255  # WHITE
     
-    # Calculate title dimensions (approximate)
-    title_width = len(TITLE) * 55  # Rough estimate based on 90px font
-    title_height = 120  # Rough estimate
-    
     # Draw glow behind title
     glow_radius = 200 + 100 * energy_factor
     if on_beat:
         glow_radius += 50  # Extra glow on beats
-        
-    for i in range(3):
-        current_radius = glow_radius * (1 - i * 0.3)
-        alpha = int(100 * (1 - i * 0.3) * energy_factor)
-        
-        # Draw radial gradient
-        for radius in range(int(current_radius), 0, -20):
-            # Reduce alpha as we move outward
-            circle_alpha = int(alpha * (radius / current_radius))
-            draw.ellipse(
-                [center_x - radius, center_y - radius, center_x + radius, center_y + radius],
-                outline=(r, g, b, circle_alpha),
-                width=10
-            )
-    
-    # Draw waveform above and below title
-    window_duration = 0.1  # 100ms window
-    start_sample = max(0, int((t - window_duration/2) * sr))
-    end_sample = min(int((t + window_duration/2) * sr), len(y))
+    layer = Layer(Image.fromarray(radial_glow.render(glow_radius, energy_factor, (r, g, b)), 'RGBA'), glow_box[:2])
+    draw = layer.draw()
     
-    if start_sample < end_sample:
-        segment = y[start_sample:end_sample]
-        if len(segment) > 0:
-            # Normalize segment
-            max_val = np.max(np.abs(segment))
-            if max_val > 0:
-                segment = segment / max_val
-                
-                # Draw waveform
-                waveform_top = center_y - title_height - 60
-                waveform_bottom = center_y + title_height + 60
-                
-                # Number of points to plot
-                n_points = min(len(segment), 200)
-                step = len(segment) // n_points if len(segment) > n_points else 1
-                
-                points_above = []
-                points_below = []
-                
-                for i in range(0, len(segment), step):
-                    if len(points_above) >= n_points:
-                        break
-                        
-                    # X position spans from left of title to right of title
-                    x = center_x - title_width + (title_width * 2 * i / len(segment))
-                    
-                    # Y position based on audio sample value
-                    y_offset = segment[i] * 50 * (1 + energy_factor)
-                    
-                    # Points above and below title
-                    points_above.append((x, waveform_top + y_offset))
-                    points_below.append((x, waveform_bottom - y_offset))
-                
-                # Draw waveform lines in WHITE
-                if len(points_above) > 1:
-                    draw.line(points_above, fill=(255, 255, 255), width=2)
-                if len(points_below) > 1:
-                    draw.line(points_below, fill=(255, 255, 255), width=2)
+    # Draw waveform above and below title, spanning from left of title to right of title
+    # (coordinates relative to the layer)
+    above, below = waveform.lines(t, center_x - title_width - glow_box[0], title_width * 2,
+                                  waveform_top - glow_box[1], waveform_bottom - glow_box[1],
+                                  50 * (1 + energy_factor))
+    if above is not None:
+        draw.line(above, fill=(255, 255, 255), width=2)
+        draw.line(below, fill=(255, 255, 255), width=2)
     
-    return np.array(img)
+    return layer
 
 # Create clips
-title_glow = VideoClip(make_frame=make_title_glow, duration=duration)
+title_glow = layer_clip(make_title_glow, glow_box, duration)
 title_clip = create_title_clip()
 
 # Composite all clips
-video = CompositeVideoClip([
-    background,
-    image_clip,  # Background image with 80% opacity
+video = composite_clip([
+    background,  # Background image at 80% opacity over black
     title_glow,  # Glow and waveform effects in WHITE
     title_clip,  # Centered title with effects in WHITE
     progress_clip  # Progress bar at bottom
-])
-
-# Add audio
-video = video.set_audio(audio)
+], use_bgclip=True)
 
 # Write the video
 print(f"Writing video to {OUTPUT_PATH}...")
-video.write_videofile(OUTPUT_PATH, fps=24, codec='libx264', audio_codec='aac')
+if RENDER_SEGMENTS > 1:
+    # Time ranges rendered and encoded in parallel, then joined without re-encoding
+    # (the glow cache lives in the worker processes, so there's no report)
+    total_frames = len(np.arange(0, video.duration, 1.0 / FPS))  # as many frames as write_videofile writes
+    write_segmented(lambda i: video.get_frame(i / FPS), total_frames, OUTPUT_PATH, (w_video, h_video), FPS,
+                    audio_path=TRACK_PATH, audio_duration=duration)
+else:
+    # The soundtrack is read from the source file only for the write
+    video = video.set_audio(AudioFileClip(TRACK_PATH))
+    video.write_videofile(OUTPUT_PATH, fps=FPS, codec='libx264', audio_codec='aac')
+    glow_cache.report()
 print("Done!")
\ No newline at end of file
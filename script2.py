@@ -1,11 +1,17 @@
 import os
 from dotenv import load_dotenv
-import librosa
 import numpy as np
-from moviepy.editor import AudioFileClip, ImageClip, ColorClip, CompositeVideoClip, TextClip, VideoClip
-from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
+from moviepy.editor import AudioFileClip, ColorClip, TextClip, VideoClip
+from PIL import Image, ImageDraw
 import moviepy.config as mpconf
 import colorsys
+from audio_analysis import BeatIndex, FeatureTimeline, get_analysis_profile
+from audio_ingest import ingest_audio
+from title_effects import GLOW_PAD, GlowMaskCache, RadialGlow, TitleRaster, WaveformLine, render_title_glow, title_alpha
+from background import BlurredBackground
+from layers import Layer, clip_box, layer_clip, rgba_video_clip, union_box
+from compositor import composite_clip
+from frame_pool import RENDER_SEGMENTS, write_segmented
 import sys
 
 # ======== COLOR SETTINGS (EASY TO CUSTOMIZE) ========
@@ -38,30 +44,22 @@ OUTPUT_PATH = os.getenv("OUTPUT_PATH2", "do_the_loftwah-2.mp4")
 
 print(f"Creating video from {TRACK_PATH} and {IMAGE_PATH}")
 
-# Load audio
-audio = AudioFileClip(TRACK_PATH)
-duration = audio.duration
-y, sr = librosa.load(TRACK_PATH)
+# Load audio once and analyze it for beats, tempo, RMS and spectral features (cached between runs)
+analysis_profile = get_analysis_profile()  # ANALYSIS_PROFILE=fast for quicker drafts
+ingest = ingest_audio(TRACK_PATH, **analysis_profile)
+duration = ingest["duration"]
+analysis = ingest["analysis"]
 print(f"Audio duration: {duration:.2f} seconds")
 
-# Analyze audio for beats and tempo
-tempo, beats = librosa.beat.beat_track(y=y, sr=sr)
-beat_times = librosa.frames_to_time(beats, sr=sr)
+y, sr = analysis["y"], analysis["sr"]
+tempo = analysis["tempo"]
+beat_times = analysis["beat_times"]
+beat_index = BeatIndex(beat_times)
 print(f"Detected tempo: {float(tempo):.2f} BPM with {len(beat_times)} beats")
 
-# Compute RMS for visual effects
-frame_length = 2048
-hop_length = 512
-rms = librosa.feature.rms(y=y, frame_length=frame_length, hop_length=hop_length)[0]
-rms_times = librosa.times_like(rms, sr=sr, hop_length=hop_length)
-min_rms = np.min(rms)
-max_rms = np.max(rms)
-
-# Compute spectral features for more advanced effects
-spectral_centroid = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
-spectral_times = librosa.times_like(spectral_centroid, sr=sr)
-min_spectral = np.min(spectral_centroid)
-max_spectral = np.max(spectral_centroid)
+# Resample RMS energy, spectral centroid and beat proximity onto the output frame grid once
+FPS = 24
+timeline = FeatureTimeline(analysis, duration, fps=FPS, beat_index=beat_index)
 
 # Video dimensions
 w_video, h_video = 1920, 1080
@@ -72,7 +70,13 @@ background = ColorClip(size=(w_video, h_video), color=BACKGROUND_COLOR).set_dura
 # Load image with error handling
 try:
     print(f"Loading image: {IMAGE_PATH}")
-    image_clip = ImageClip(IMAGE_PATH).set_duration(duration)
+    # Blurred and dimmed at a few radii and already at its final size (slightly
+    # larger than the screen, with some room for movement); see BG_BLUR_LEVELS in .env.
+    # None of its placement changes over time, so it's folded in once: centred on
+    # the background colour at IMAGE_OPACITY, cropped to the screen.
+    background_image = BlurredBackground(IMAGE_PATH, h_video * 1.1, brightness=IMAGE_BRIGHTNESS,
+                                         opacity=IMAGE_OPACITY, frame_size=(w_video, h_video),
+                                         color=BACKGROUND_COLOR)
     image_loaded = True
 except Exception as e:
     print(f"Error loading image: {e}")
@@ -80,68 +84,20 @@ except Exception as e:
     image_clip = ColorClip(size=(w_video, h_video), color=(30, 30, 30)).set_duration(duration)
     image_loaded = False
 
-# Patch the resizer function in moviepy to fix ANTIALIAS issue
-def patched_resizer(image, newsize):
-    pilim = Image.fromarray(image)
-    
-    # Handle if newsize contains floats instead of integers
-    if isinstance(newsize, tuple) and len(newsize) == 2:
-        # When newsize is a tuple of scaling factors
-        h, w = image.shape[:2]
-        if isinstance(newsize[0], (float, np.float64, np.float32)):
-            new_w = int(w * newsize[0])
-            new_h = int(h * newsize[1])
-            newsize = (new_w, new_h)
-    
-    # Ensure newsize contains integers
-    if not isinstance(newsize[0], int):
-        newsize = tuple(int(round(float(x))) for x in newsize)
-    
-    # Use LANCZOS instead of ANTIALIAS (which is deprecated in newer PIL versions)
-    resample_method = getattr(Image, "LANCZOS", getattr(Image.Resampling, "LANCZOS", Image.BICUBIC))
-    
-    # Reverse width and height for PIL's resize (it expects width, height)
-    resized_pil = pilim.resize(newsize[::-1], resample_method)
-    return np.array(resized_pil)
-
-# Monkey patch the resizer function in moviepy
-from moviepy.video.fx.resize import resizer
-import moviepy.video.fx.resize
-moviepy.video.fx.resize.resizer = patched_resizer
-
 # Apply subtle movement to image
-def process_bg_image(image, t):
-    # Convert PIL image to numpy array, apply blur and reduce opacity
-    img = Image.fromarray(image)
-    
+def process_bg_image(t):
     # Blur amount based on audio energy
-    rms_value = np.interp(t, rms_times, rms)
-    blur_amount = 2 + (rms_value - min_rms) / (max_rms - min_rms) * 3  # Blur between 2 and 5
-    img = img.filter(ImageFilter.GaussianBlur(radius=blur_amount))
-    
-    # Reduce brightness and add a slight tint
-    enhancer = ImageEnhance.Brightness(img)
-    img = enhancer.enhance(IMAGE_BRIGHTNESS)  # Control image brightness
-    
-    return np.array(img)
+    energy_factor = timeline.energy_factor[timeline.index(t)]
+    blur_amount = 2 + energy_factor * 3  # Blur between 2 and 5
+    return background_image.render(blur_amount)
 
 if image_loaded:
-    # Apply the image processing
-    image_clip = image_clip.fl(lambda gf, t: process_bg_image(gf(t), t))
-    
-    try:
-        # Resize the image to fill the screen with some room for movement
-        image_clip = image_clip.resize(height=h_video * 1.1)  # Make it slightly larger than the screen
-        print("Successfully resized background image")
-    except Exception as e:
-        print(f"Error resizing image: {e}")
-        print("Using original image size")
+    # Full-frame background with the image: the compositor starts every frame from it
+    background = VideoClip(make_frame=process_bg_image, duration=duration)
 
-    # Set position with subtle movement
-    image_clip = image_clip.set_position('center')
-
-    # Set image opacity
-    image_clip = image_clip.set_opacity(IMAGE_OPACITY)
+# Blurred title glow masks, reused across frames with similar energy; the rainbow
+# colour is tinted in per frame (see GLOW_CACHE_* in .env)
+glow_cache = GlowMaskCache()
 
 # Title effects with enhanced waveform response
 def create_title_clip():
@@ -156,21 +112,26 @@ def create_title_clip():
         base_title = TextClip(TITLE, fontsize=90, color=(255, 255, 255), kerning=5)
         print("Created title with default font")
     
-    # Make it last the entire duration
-    base_title = base_title.set_duration(duration)
+    # The title raster itself never changes; only its glow colour, strength and
+    # scale follow the audio. TextClip frames are RGB with the text's alpha in the
+    # clip's mask, and the raster gets a clear border so the glow can fade out around the text.
+    image, mask = base_title.get_frame(0), base_title.mask.get_frame(0)
+    title = TitleRaster(image, mask=mask, pad=GLOW_PAD)
     
-    # Position in center
-    base_title = base_title.set_position('center')
+    # For debugging - print the actual colors in the image
+    sample = image[::10, ::10]  # Sample every 10 pixels
+    near_white = np.all(sample[:, :, :3] > 240, axis=2)
+    has_white = bool(np.any((title_alpha(sample, mask[::10, ::10]) > 0) & near_white))
+    print(f"Image has white pixels: {has_white}")
     
     # Apply glow effects to the title based on audio
-    def title_transform(image, t):
+    def title_transform(t):
         # Get current audio features
-        rms_value = np.interp(t, rms_times, rms)
-        energy_factor = (rms_value - min_rms) / (max_rms - min_rms)
+        frame = timeline.index(t)
+        energy_factor = timeline.energy_factor[frame]
         
         # Get current spectral centroid for rainbow color
-        spectral_value = np.interp(t, spectral_times, spectral_centroid)
-        spectral_factor = (spectral_value - min_spectral) / (max_spectral - min_spectral)
+        spectral_factor = timeline.spectral_factor[frame]
         
         # Calculate a time-based rainbow hue that cycles slowly
         time_hue = (t / 10) % 1.0  # Complete color cycle every 10 seconds
@@ -178,47 +139,8 @@ def create_title_clip():
         rainbow_hue = (BASE_HUE + time_hue + 0.3 * spectral_factor) % 1.0
         
         # Check if we're on a beat
-        on_beat = False
-        beat_distance = 1.0
-        for beat_time in beat_times:
-            dist = abs(t - beat_time)
-            if dist < beat_distance:
-                beat_distance = dist
-            if dist < 0.1:  # Within 100ms of a beat
-                on_beat = True
-                break
-        
-        # Convert to PIL image for processing
-        img = Image.fromarray(image)
-        
-        # For debugging - print the actual colors in the image
-        if t < 0.1:  # Only at the start to avoid console spam
-            has_white = False
-            for x in range(0, img.width, 10):  # Sample every 10 pixels
-                for y in range(0, img.height, 10):
-                    pixel = img.getpixel((x, y))
-                    if len(pixel) > 3 and pixel[3] > 0:  # Non-transparent
-                        if pixel[0] > 240 and pixel[1] > 240 and pixel[2] > 240:  # Near white
-                            has_white = True
-            print(f"Image has white pixels: {has_white}")
-        
-        # Always keep text pure white for better visibility
-        r, g, b = 255, 255, 255
-        
-        # Create a colored version of the text
-        colored_img = Image.new('RGBA', img.size)
-        
-        for x in range(img.width):
-            for y in range(img.height):
-                pixel = img.getpixel((x, y))
-                if len(pixel) > 3 and pixel[3] > 0:  # If not fully transparent
-                    # Force white for text
-                    colored_img.putpixel((x, y), (r, g, b, pixel[3]))
-                else:
-                    colored_img.putpixel((x, y), (0, 0, 0, 0))
-        
-        # Apply glow effect based on audio energy
-        result = Image.new('RGBA', img.size, (0, 0, 0, 0))
+        beat_distance = timeline.beat_distance[frame]
+        on_beat = bool(timeline.on_beat[frame])  # Within 100ms of a beat
         
         # Determine glow intensity based on beat and energy
         if on_beat:
@@ -230,35 +152,15 @@ def create_title_clip():
             glow_strength = 0.5 + (energy_factor * 0.5)
             glow_radius = 2 + energy_factor * 5
         
-        # Create the glow effect with multiple layers
+        # Create rainbow-colored glow layers, each one getting a different hue
+        glow_colors = []
         for i in range(3):
-            # Different radius for each layer
-            current_radius = glow_radius * (1 - i * 0.3)
-            
-            # Create rainbow-colored glow layers
-            layer_hue = (rainbow_hue + i * 0.2) % 1.0  # Each layer gets a different hue
-            layer_r, layer_g, layer_b = [int(255 * c) for c in colorsys.hsv_to_rgb(
-                layer_hue, COLOR_SATURATION, COLOR_BRIGHTNESS)]
-            
-            # Create colored layer
-            glow_layer = Image.new('RGBA', img.size)
-            for x in range(img.width):
-                for y in range(img.height):
-                    pixel = img.getpixel((x, y))
-                    if len(pixel) > 3 and pixel[3] > 0:
-                        alpha = min(255, int(pixel[3] * glow_strength * (1 - i * 0.3)))
-                        glow_layer.putpixel((x, y), (layer_r, layer_g, layer_b, alpha))
-                    else:
-                        glow_layer.putpixel((x, y), (0, 0, 0, 0))
-            
-            # Blur the layer
-            glow_layer = glow_layer.filter(ImageFilter.GaussianBlur(radius=current_radius))
-            
-            # Composite onto result
-            result = Image.alpha_composite(result, glow_layer)
+            layer_hue = (rainbow_hue + i * 0.2) % 1.0
+            glow_colors.append([int(255 * c) for c in colorsys.hsv_to_rgb(
+                layer_hue, COLOR_SATURATION, COLOR_BRIGHTNESS)])
         
-        # Finally add the sharp WHITE text on top
-        result = Image.alpha_composite(result, colored_img)
+        # Glow layers under the sharp WHITE text (always pure white for better visibility)
+        result = render_title_glow(title, glow_strength, glow_radius, glow_colors, cache=glow_cache)
         
         # Apply scaling directly to the image (instead of using resize)
         if on_beat:
@@ -266,26 +168,23 @@ def create_title_clip():
             scale_factor = 1.0 + 0.1 * (1.0 - beat_distance * 10) * energy_factor
             if scale_factor > 1.0:
                 # Calculate new dimensions
-                new_width = int(img.width * scale_factor)
-                new_height = int(img.height * scale_factor)
+                new_width = int(title.size[0] * scale_factor)
+                new_height = int(title.size[1] * scale_factor)
                 
                 # Calculate offsets to keep centered
-                offset_x = (new_width - img.width) // 2
-                offset_y = (new_height - img.height) // 2
+                offset_x = (new_width - title.size[0]) // 2
+                offset_y = (new_height - title.size[1]) // 2
                 
                 # Create a new larger image with the scaled result
                 scaled_result = Image.new('RGBA', (new_width, new_height), (0, 0, 0, 0))
                 scaled_result.paste(result, (offset_x, offset_y))
                 result = scaled_result
         
-        # Convert to RGB before returning (this is crucial to avoid alpha channel issues)
-        rgb_result = Image.new('RGB', result.size, (0, 0, 0))
-        rgb_result.paste(result, (0, 0), result)
-        
-        return np.array(rgb_result)
+        # RGBA: the glow's alpha is the clip's mask, so it shows around the text
+        return np.array(result)
     
-    # Apply the transformation
-    return base_title.fl(lambda gf, t: title_transform(gf(t), t))
+    # Apply the transformation for the entire duration, centred
+    return rgba_video_clip(title_transform, duration).set_position('center')
 
 # Progress bar
 def make_progress_frame(t):
@@ -298,28 +197,40 @@ def make_progress_frame(t):
 progress_clip = VideoClip(make_frame=make_progress_frame, duration=duration).set_position(('center', h_video - 20))
 
 # Title glowing effect
+# Center of the screen
+center_x, center_y = w_video // 2, h_video // 2
+
+# Calculate title dimensions (approximate)
+title_width = len(TITLE) * 55  # Rough estimate based on 90px font
+title_height = 120  # Rough estimate
+waveform_top = center_y - title_height - 60
+waveform_bottom = center_y + title_height + 60
+
+# The only part of the frame the glow can reach: the largest ring (radius 350 on a
+# loud beat) and the waveforms swinging up to 100px either side of their lines
+glow_box = clip_box(union_box((center_x - 352, center_y - 352, center_x + 353, center_y + 353),
+                              (center_x - title_width - 2, waveform_top - 102,
+                               center_x + title_width + 3, waveform_bottom + 103)),
+                    (w_video, h_video))
+
+# Distance of every pixel in that region from the centre, for the ring glow behind the title
+radial_glow = RadialGlow((glow_box[2] - glow_box[0], glow_box[3] - glow_box[1]),
+                         center=(center_x - glow_box[0], center_y - glow_box[1]))
+
+# Waveform lines above and below the title (WAVEFORM_POINTS points each)
+waveform = WaveformLine(y, sr)
+
 def make_title_glow(t):
-    # Create a transparent image
-    img = Image.new('RGB', (w_video, h_video), color=(0, 0, 0))
-    draw = ImageDraw.Draw(img)
-    
+    # Layer over glow_box: ring glow and waveforms on a transparent background
     # Get current RMS value for intensity
-    rms_value = np.interp(t, rms_times, rms)
-    energy_factor = (rms_value - min_rms) / (max_rms - min_rms)
+    frame = timeline.index(t)
+    energy_factor = timeline.energy_factor[frame]
     
     # Get current spectral centroid for rainbow color
-    spectral_value = np.interp(t, spectral_times, spectral_centroid)
-    spectral_factor = (spectral_value - min_spectral) / (max_spectral - min_spectral)
+    spectral_factor = timeline.spectral_factor[frame]
     
     # Check if we're on a beat
-    on_beat = False
-    for beat_time in beat_times:
-        if abs(t - beat_time) < 0.1:  # Within 100ms of a beat
-            on_beat = True
-            break
-    
-    # Center of the screen
-    center_x, center_y = w_video // 2, h_video // 2
+    on_beat = bool(timeline.on_beat[frame])  # Within 100ms of a beat
     
     # Create a rainbow glow effect behind the title
     # Calculate a time-based rainbow hue that cycles slowly
@@ -331,86 +242,36 @@ def make_title_glow(t):
     r, g, b = [int(255 * c) for c in colorsys.hsv_to_rgb(
         rainbow_hue, COLOR_SATURATION, COLOR_BRIGHTNESS + 0.3 * energy_factor)]
     
-    # Calculate title dimensions (approximate)
-    title_width = len(TITLE) * 55  # Rough estimate based on 90px font
-    title_height = 120  # Rough estimate
-    
     # Draw glow behind title
     glow_radius = 200 + 100 * energy_factor
     if on_beat:
         glow_radius += 50  # Extra glow on beats
-        
-    for i in range(3):
-        current_radius = glow_radius * (1 - i * 0.3)
-        alpha = int(100 * (1 - i * 0.3) * energy_factor)
-        
-        # Draw radial gradient
-        for radius in range(int(current_radius), 0, -20):
-            # Reduce alpha as we move outward
-            circle_alpha = int(alpha * (radius / current_radius))
-            draw.ellipse(
-                [center_x - radius, center_y - radius, center_x + radius, center_y + radius],
-                outline=(r, g, b, circle_alpha),
-                width=10
-            )
-    
-    # Draw waveform above and below title
-    window_duration = 0.1  # 100ms window
-    start_sample = max(0, int((t - window_duration/2) * sr))
-    end_sample = min(int((t + window_duration/2) * sr), len(y))
+    layer = Layer(Image.fromarray(radial_glow.render(glow_radius, energy_factor, (r, g, b)), 'RGBA'), glow_box[:2])
+    draw = layer.draw()
     
-    if start_sample < end_sample:
-        segment = y[start_sample:end_sample]
-        if len(segment) > 0:
-            # Normalize segment
-            max_val = np.max(np.abs(segment))
-            if max_val > 0:
-                segment = segment / max_val
-                
-                # Draw waveform
-                waveform_top = center_y - title_height - 60
-                waveform_bottom = center_y + title_height + 60
-                
-                # Number of points to plot
-                n_points = min(len(segment), 200)
-                step = len(segment) // n_points if len(segment) > n_points else 1
-                
-                points_above = []
-                points_below = []
-                
-                for i in range(0, len(segment), step):
-                    if len(points_above) >= n_points:
-                        break
-                        
-                    # X position spans from left of title to right of title
-                    x = center_x - title_width + (title_width * 2 * i / len(segment))
-                    
-                    # Y position based on audio sample value
-                    y_offset = segment[i] * 50 * (1 + energy_factor)
-                    
-                    # Points above and below title
-                    points_above.append((x, waveform_top + y_offset))
-                    points_below.append((x, waveform_bottom - y_offset))
-                
-                # Draw waveform lines with rainbow colors
-                if len(points_above) > 1:
-                    # Create a different hue for each waveform
-                    wave_hue = (rainbow_hue + 0.5) % 1.0  # Complementary color to main glow
-                    wave_r, wave_g, wave_b = [int(255 * c) for c in colorsys.hsv_to_rgb(
-                        wave_hue, COLOR_SATURATION, COLOR_BRIGHTNESS)]
-                    draw.line(points_above, fill=(wave_r, wave_g, wave_b), width=2)
-                if len(points_below) > 1:
-                    # Slightly different hue for bottom waveform
-                    wave_hue2 = (rainbow_hue + 0.3) % 1.0
-                    wave_r2, wave_g2, wave_b2 = [int(255 * c) for c in colorsys.hsv_to_rgb(
-                        wave_hue2, COLOR_SATURATION, COLOR_BRIGHTNESS)]
-                    draw.line(points_below, fill=(wave_r2, wave_g2, wave_b2), width=2)
+    # Draw waveform above and below title, spanning from left of title to right of title
+    # (coordinates relative to the layer)
+    above, below = waveform.lines(t, center_x - title_width - glow_box[0], title_width * 2,
+                                  waveform_top - glow_box[1], waveform_bottom - glow_box[1],
+                                  50 * (1 + energy_factor))
+    if above is not None:
+        # Draw waveform lines with rainbow colors
+        # Create a different hue for each waveform
+        wave_hue = (rainbow_hue + 0.5) % 1.0  # Complementary color to main glow
+        wave_r, wave_g, wave_b = [int(255 * c) for c in colorsys.hsv_to_rgb(
+            wave_hue, COLOR_SATURATION, COLOR_BRIGHTNESS)]
+        draw.line(above, fill=(wave_r, wave_g, wave_b), width=2)
+        # Slightly different hue for bottom waveform
+        wave_hue2 = (rainbow_hue + 0.3) % 1.0
+        wave_r2, wave_g2, wave_b2 = [int(255 * c) for c in colorsys.hsv_to_rgb(
+            wave_hue2, COLOR_SATURATION, COLOR_BRIGHTNESS)]
+        draw.line(below, fill=(wave_r2, wave_g2, wave_b2), width=2)
     
-    return np.array(img)
+    return layer
 
 # Create clips - Create simplified title for better visibility if needed
 try:
-    title_glow = VideoClip(make_frame=make_title_glow, duration=duration)
+    title_glow = layer_clip(make_title_glow, glow_box, duration)
     title_clip = create_title_clip()
     print("Successfully created title and glow effects")
     
@@ -429,8 +290,6 @@ except Exception as e:
 
 # Composite all clips
 clips_to_composite = [background]
-if image_loaded:
-    clips_to_composite.append(image_clip)
 clips_to_composite.extend([
     title_glow,     # Glow and waveform effects
     title_clip,     # Centered title with effects
@@ -443,12 +302,19 @@ if has_plain_title:
 # Add progress bar last so it's always on top
 clips_to_composite.append(progress_clip)
 
-video = CompositeVideoClip(clips_to_composite)
-
-# Add audio
-video = video.set_audio(audio)
+video = composite_clip(clips_to_composite, use_bgclip=True)
 
 # Write the video
 print(f"Writing video to {OUTPUT_PATH}...")
-video.write_videofile(OUTPUT_PATH, fps=24, codec='libx264', audio_codec='aac')
+if RENDER_SEGMENTS > 1:
+    # Time ranges rendered and encoded in parallel, then joined without re-encoding
+    # (the glow cache lives in the worker processes, so there's no report)
+    total_frames = len(np.arange(0, video.duration, 1.0 / FPS))  # as many frames as write_videofile writes
+    write_segmented(lambda i: video.get_frame(i / FPS), total_frames, OUTPUT_PATH, (w_video, h_video), FPS,
+                    audio_path=TRACK_PATH, audio_duration=duration)
+else:
+    # The soundtrack is read from the source file only for the write
+    video = video.set_audio(AudioFileClip(TRACK_PATH))
+    video.write_videofile(OUTPUT_PATH, fps=FPS, codec='libx264', audio_codec='aac')
+    glow_cache.report()
 print("Done!")
\ No newline at end of file
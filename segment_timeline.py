@@ -0,0 +1,74 @@
+import math
+import numpy as np
+from PIL import Image
+from video_writer import FrameWriter
+
+# Flat timeline for videos assembled from pre-rendered frame sequences (the style
+# and effect demos in test.py and test2.py). Every output frame index maps to one
+# source frame through a table built up front, so finding a frame is a single
+# lookup instead of walking nested CompositeVideoClips, and frames go straight to
+# the encoder. Segments may overlap: like clips later in a CompositeVideoClip
+# list, a segment added later covers earlier ones where they overlap (the
+# "Next Effect..." transitions over the end of each segment).
+
+# Slack for float segment boundaries such as 3.8 s * 24 fps
+EPSILON = 1e-6
+
+
+class SegmentTimeline:
+
+    def __init__(self, duration, fps, size, background=(0, 0, 0)):
+        self.fps = fps
+        self.size = size
+        self.background = background
+        self.n_frames = int(math.ceil(duration * fps - EPSILON))
+        self.sources = []
+        # Index into self.sources for every output frame, -1 where nothing plays
+        self.table = np.full(self.n_frames, -1, dtype=np.int64)
+        self.overlays = []
+        self.cached = (None, None)
+
+    def add_segment(self, frames, start, duration):
+        # Show `frames` (paths or PIL images), one per output frame, from `start` for
+        # `duration` seconds; the last frame holds if the segment outlasts them
+        first = int(math.ceil(start * self.fps - EPSILON))
+        end = min(int(math.ceil((start + duration) * self.fps - EPSILON)), self.n_frames)
+        if end <= first or not frames:
+            return
+        base = len(self.sources)
+        self.sources.extend(frames)
+        indices = np.arange(first, end)
+        local = np.floor(indices - start * self.fps + EPSILON).astype(np.int64)
+        self.table[first:end] = base + np.clip(local, 0, len(frames) - 1)
+
+    def add_overlay(self, image):
+        # RGBA image over every frame; only the box it actually draws in is blended
+        image = image.convert("RGBA")
+        box = image.getbbox()
+        if box is not None:
+            self.overlays.append((image.crop(box), box[:2]))
+
+    def frame(self, i):
+        # Output frame i as an RGB PIL image. Runs of output frames showing the
+        # same source frame reuse one decode.
+        source = int(self.table[i])
+        if self.cached[0] == source:
+            return self.cached[1]
+        if source < 0:
+            img = Image.new("RGB", self.size, self.background)
+        else:
+            img = self.sources[source]
+            img = Image.open(img) if not isinstance(img, Image.Image) else img
+            img = img.convert("RGB") if img.mode != "RGB" else img.copy()
+        for overlay, position in self.overlays:
+            img.paste(overlay, position, overlay)
+        self.cached = (source, img)
+        return img
+
+    def write(self, path, audio_path=None, audio_duration=None, codec="libx264"):
+        with FrameWriter(path, self.size, self.fps, codec=codec,
+                         audio_path=audio_path, audio_duration=audio_duration) as writer:
+            for i in range(self.n_frames):
+                if i % 240 == 0:
+                    print(f"Writing frame {i}/{self.n_frames} ({i / self.n_frames * 100:.1f}%)")
+                writer.write(self.frame(i))
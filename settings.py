@@ -0,0 +1,65 @@
+import os
+from dotenv import load_dotenv
+
+# Tuning settings for the shared modules, read from the environment (or .env)
+# in one place. The modules import their settings from here, so .env is loaded
+# once, whichever script or module is imported first. The scripts' own settings
+# (TRACK_PATH, IMAGE_PATH, TITLE, ...) stay in the scripts.
+
+load_dotenv()
+
+# --- Audio analysis (audio_analysis.py) ---
+
+# Where analysis results are kept between runs
+ANALYSIS_CACHE_DIR = os.getenv("ANALYSIS_CACHE_DIR", ".analysis_cache")
+
+# Number of log-spaced frequency bands in "band_energy" (one per bar in the spectrum styles)
+ANALYSIS_BANDS = int(os.getenv("ANALYSIS_BANDS", "60"))
+
+# Beat-tracking backend (see beat_tracking.py) and, for the grid trackers, a known BPM
+BEAT_TRACKER = os.getenv("BEAT_TRACKER", "librosa")
+TRACK_BPM = float(os.getenv("TRACK_BPM", "0")) or None
+
+# Analysis profile: "precise" or "fast" (see ANALYSIS_PROFILES)
+ANALYSIS_PROFILE = os.getenv("ANALYSIS_PROFILE", "precise")
+
+# Block-streaming analysis for long mixes: "auto" streams tracks longer than
+# STREAM_ANALYSIS_MIN_DURATION seconds, "1" always streams, "0" never does
+STREAM_ANALYSIS = os.getenv("STREAM_ANALYSIS", "auto")
+STREAM_ANALYSIS_MIN_DURATION = float(os.getenv("STREAM_ANALYSIS_MIN_DURATION", "1200"))
+
+# --- Title effects (title_effects.py) ---
+
+# Glow cache: glow strength and radius are each snapped to one of GLOW_CACHE_BUCKETS
+# levels, and up to GLOW_CACHE_SIZE blurred layers are kept (least recently used go first)
+GLOW_CACHE_BUCKETS = int(os.getenv("GLOW_CACHE_BUCKETS", "16"))
+GLOW_CACHE_SIZE = int(os.getenv("GLOW_CACHE_SIZE", "128"))
+
+# Points in each waveform line above and below the title
+WAVEFORM_POINTS = int(os.getenv("WAVEFORM_POINTS", "200"))
+
+# --- Blur (blur.py) ---
+
+# Quality tier for every blur: exact or pyramid
+BLUR_QUALITY = os.getenv("BLUR_QUALITY", "exact")
+
+# --- Background (background.py) ---
+
+# Blur radii (at the source image's resolution) to precompute, comma separated.
+# More levels follow the blur more closely between levels and cost memory
+# (one output-sized frame each).
+BG_BLUR_LEVELS = [float(r) for r in os.getenv("BG_BLUR_LEVELS", "2,3,4,5").split(",") if r.strip()]
+
+# --- Rendering (frame_pool.py, frame_random.py) ---
+
+# Worker processes for frame rendering (default: all cores). 1 renders in-process.
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "0")) or os.cpu_count() or 1
+# Consecutive frames per task
+RENDER_CHUNK = int(os.getenv("RENDER_CHUNK", "8"))
+# Time ranges encoded in parallel by write_segmented (1: one encode)
+RENDER_SEGMENTS = int(os.getenv("RENDER_SEGMENTS", "1"))
+# Keyframe interval of segmented encodes; segments are whole numbers of these
+KEYFRAME_SECONDS = float(os.getenv("KEYFRAME_SECONDS", "2"))
+
+# Change for a different (but still reproducible) set of random effects
+RENDER_SEED = int(os.getenv("RENDER_SEED", "0"))
@@ -1,13 +1,14 @@
 import os
 from dotenv import load_dotenv
-import numpy as np
-from moviepy.editor import AudioFileClip, ImageClip, ColorClip, CompositeVideoClip
-from PIL import Image, ImageDraw, ImageFont, ImageFilter, ImageEnhance
+from moviepy.editor import AudioFileClip
+from PIL import Image, ImageDraw, ImageFont, ImageEnhance
 import moviepy.config as mpconf
 import tempfile
 import math
 import colorsys
 import time
+from layers import Layer
+from segment_timeline import SegmentTimeline
 
 # Set ImageMagick path (adjust if needed)
 mpconf.change_settings({"IMAGEMAGICK_BINARY": "/opt/homebrew/bin/convert"})
@@ -172,14 +173,12 @@ for i, style in enumerate(styles):
             # Create a separate image for the rotated text
             angle = 15 * math.sin(t * math.pi * 2)  # Oscillate between -15 and 15 degrees
             
-            # For rotation, we need to create a separate image just for the text
-            txt_img = Image.new("RGBA", (w_video, h_video), (0, 0, 0, 0))
-            txt_draw = ImageDraw.Draw(txt_img)
-            txt_draw.text((x, y), text, fill=text_color, font=font)
+            # For rotation, we need a separate layer just for the text
+            txt_layer = Layer.text((x, y), text, fill=text_color, font=font)
             
-            # Rotate the text image
-            rotated_txt = txt_img.rotate(angle, resample=Image.BICUBIC, center=(x + text_width//2, y + text_height//2))
-            img = Image.alpha_composite(img, rotated_txt)
+            # Rotate the text layer
+            rotated_txt = txt_layer.rotate(angle, center=(x + text_width//2, y + text_height//2))
+            rotated_txt.composite_onto(img)
         else:
             # Apply standard effects
             if style["effects"] == "none" or style["effects"] == "audio_reactive" or style["effects"] == "enhanced_bg" or style["effects"] == "color_cycle":
@@ -190,27 +189,15 @@ for i, style in enumerate(styles):
                 if style["effects"] == "audio_reactive":
                     glow_radius = int(glow_radius * (1 + simulated_volume))
                 
-                text_img = Image.new("RGBA", (w_video, h_video), (0, 0, 0, 0))
-                text_draw = ImageDraw.Draw(text_img)
-                text_draw.text((x, y), text, fill=text_color, font=font)
-                glow_img = text_img.filter(ImageFilter.GaussianBlur(glow_radius))
-                glow_data = np.array(glow_img)
-                r, g, b, a = glow_data.T
-                colored_areas = a > 0
-                glow_data[..., 0][colored_areas.T] = style["glow_color"][0]
-                glow_data[..., 1][colored_areas.T] = style["glow_color"][1]
-                glow_data[..., 2][colored_areas.T] = style["glow_color"][2]
-                glow_img = Image.fromarray(glow_data)
-                img = Image.alpha_composite(img, glow_img)
-                img = Image.alpha_composite(img, text_img)
+                text_layer = Layer.text((x, y), text, fill=text_color, font=font)
+                glow_layer = text_layer.blur(glow_radius).tint(style["glow_color"])
+                glow_layer.composite_onto(img)
+                text_layer.composite_onto(img)
             elif style["effects"] == "shadow":
-                shadow_img = Image.new("RGBA", (w_video, h_video), (0, 0, 0, 0))
-                shadow_draw = ImageDraw.Draw(shadow_img)
                 shadow_x = x + style["shadow_offset"][0]
                 shadow_y = y + style["shadow_offset"][1]
-                shadow_draw.text((shadow_x, shadow_y), text, fill=style["shadow_color"] + (150,), font=font)
-                shadow_img = shadow_img.filter(ImageFilter.GaussianBlur(3))
-                img = Image.alpha_composite(img, shadow_img)
+                shadow_layer = Layer.text((shadow_x, shadow_y), text, fill=style["shadow_color"] + (150,), font=font)
+                shadow_layer.blur(3).composite_onto(img)
                 draw.text((x, y), text, fill=text_color, font=font)
             elif style["effects"] == "outline":
                 outline_color = style["outline_color"]
@@ -280,72 +267,28 @@ draw.rectangle(
     fill=(0, 0, 0, 128)  # Semi-transparent black
 )
 draw.text((x, y), instructions, fill=(255, 255, 255), font=small_font)
-instructions_path = os.path.join(temp_dir, "instructions.png")
 
-# Convert to RGB for MoviePy
-bg = Image.new("RGB", instructions_img.size, (0, 0, 0))
-bg.paste(instructions_img, mask=instructions_img.split()[3])  # Use alpha channel as mask
-bg.save(instructions_path)
+# Lay the segments out on one flat frame table
+timeline = SegmentTimeline(duration, TEST_FPS, TEST_RESOLUTION)
 
-# Create video clips
-all_frames = []
-segments = []
-
-# First create all the clips
 for i, style in enumerate(styles):
     style_start = i * SEGMENT_DURATION
     style_end = (i + 1) * SEGMENT_DURATION
     
     # Add this style segment
-    segment = {
-        'frames': style_frames[i],
-        'start_time': style_start,
-        'duration': SEGMENT_DURATION
-    }
-    segments.append(segment)
+    timeline.add_segment(style_frames[i], style_start, SEGMENT_DURATION)
     
-    # Add transition after each style (except the last one)
+    # Add transition after each style (except the last one), over the style's last frames
     if i < len(styles) - 1:
         transition_start = style_end - 0.2
-        
-        # Add transition segment
-        segment = {
-            'frames': transition_frames,
-            'start_time': transition_start,
-            'duration': 0.2
-        }
-        segments.append(segment)
-
-# Create a single clip from each frame sequence
-clips = []
-background = ColorClip(size=TEST_RESOLUTION, color=(0, 0, 0), duration=duration)
-clips.append(background)
-
-for segment in segments:
-    # Frames displayed at fps
-    segment_clip = ImageClip(segment['frames'][0])
-    
-    for j in range(1, len(segment['frames'])):
-        segment_clip = CompositeVideoClip([
-            segment_clip,
-            ImageClip(segment['frames'][j]).set_start(j/TEST_FPS)
-        ])
-    
-    segment_clip = segment_clip.set_duration(segment['duration']).set_start(segment['start_time'])
-    clips.append(segment_clip)
+        timeline.add_segment(transition_frames, transition_start, 0.2)
 
 # Add instructions overlay
-instructions_clip = ImageClip(instructions_path).set_duration(duration)
-clips.append(instructions_clip)
-
-# Combine all clips and add audio
-print("Creating final video...")
-video = CompositeVideoClip(clips)
-video = video.set_audio(audio)
+timeline.add_overlay(instructions_img)
 
-# Write video
+# Write video, with the track trimmed to the test duration
 print(f"Writing enhanced test video to {OUTPUT_PATH}...")
-video.write_videofile(OUTPUT_PATH, fps=TEST_FPS, codec='libx264', audio_codec='aac')
+timeline.write(OUTPUT_PATH, audio_path=TRACK_PATH, audio_duration=duration)
 print(f"Test complete! Please check {OUTPUT_PATH}")
 
 # Clean up
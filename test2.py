@@ -1,13 +1,15 @@
 import os
 from dotenv import load_dotenv
 import numpy as np
-from moviepy.editor import AudioFileClip, ImageClip, ColorClip, CompositeVideoClip
-from PIL import Image, ImageDraw, ImageFont, ImageFilter, ImageEnhance, ImageChops
+from moviepy.editor import AudioFileClip
+from PIL import Image, ImageDraw, ImageFont, ImageEnhance, ImageChops
 import moviepy.config as mpconf
 import tempfile
 import math
 import colorsys
-import random
+from blur import gaussian_blur
+from segment_timeline import SegmentTimeline
+from frame_random import frame_rng
 
 # Set ImageMagick path (adjust if needed)
 mpconf.change_settings({"IMAGEMAGICK_BINARY": "/opt/homebrew/bin/convert"})
@@ -268,7 +270,7 @@ for effect_idx, effect in enumerate(effects):
             text_draw.text((x, y), text, fill=text_color, font=font)
             
             # Add glow
-            glow = text_img.filter(ImageFilter.GaussianBlur(10))
+            glow = gaussian_blur(text_img, 10)
             img = Image.alpha_composite(img, glow)
             img = Image.alpha_composite(img, text_img)
             
@@ -376,16 +378,13 @@ for effect_idx, effect in enumerate(effects):
             x = (w_video - text_width) // 2
             y = (h_video - text_height) // 2
             
+            # Random stream of this frame alone, so frames render the same in any order
+            rng = frame_rng(effect["effect_type"], frame_idx)
+            
             # Calculate glitch offsets (more intense with beat)
             glitch_amount = 15 * simulated_volume
-            r_offset_x = int(random.uniform(-glitch_amount, glitch_amount))
-            r_offset_y = int(random.uniform(-glitch_amount/2, glitch_amount/2))
-            
-            g_offset_x = int(random.uniform(-glitch_amount, glitch_amount))
-            g_offset_y = int(random.uniform(-glitch_amount/2, glitch_amount/2))
-            
-            b_offset_x = int(random.uniform(-glitch_amount, glitch_amount))
-            b_offset_y = int(random.uniform(-glitch_amount/2, glitch_amount/2))
+            offsets = (rng.uniform(-1, 1, (3, 2)) * [glitch_amount, glitch_amount / 2]).astype(int).tolist()
+            (r_offset_x, r_offset_y), (g_offset_x, g_offset_y), (b_offset_x, b_offset_y) = offsets
             
             # Draw offset colored text
             r_draw.text((x + r_offset_x, y + r_offset_y), text, fill=(255, 0, 0, 180), font=font)
@@ -399,17 +398,13 @@ for effect_idx, effect in enumerate(effects):
             
             # Add some random glitch rectangles
             num_glitches = int(5 * simulated_volume)
-            for _ in range(num_glitches):
-                glitch_width = random.randint(50, 200)
-                glitch_height = random.randint(5, 20)
-                glitch_x = random.randint(0, w_video - glitch_width)
-                glitch_y = random.randint(0, h_video - glitch_height)
-                
-                # Random color
-                r = random.randint(0, 255)
-                g = random.randint(0, 255)
-                b = random.randint(0, 255)
-                
+            widths = rng.integers(50, 201, num_glitches)
+            heights = rng.integers(5, 21, num_glitches)
+            rects = zip(widths.tolist(), heights.tolist(),
+                        rng.integers(0, w_video - widths + 1).tolist(),
+                        rng.integers(0, h_video - heights + 1).tolist(),
+                        rng.integers(0, 256, (num_glitches, 3)).tolist())  # Random color
+            for glitch_width, glitch_height, glitch_x, glitch_y, (r, g, b) in rects:
                 draw = ImageDraw.Draw(img)
                 draw.rectangle([glitch_x, glitch_y, glitch_x + glitch_width, glitch_y + glitch_height], 
                                fill=(r, g, b, 150))
@@ -419,22 +414,22 @@ for effect_idx, effect in enumerate(effects):
             # Number of shapes depends on audio volume
             num_shapes = int(30 + 50 * simulated_volume)
             
+            # Pick random properties for every shape of this frame from its own stream
+            rng = frame_rng(effect["effect_type"], frame_idx)
+            sizes = rng.integers(20, 101, num_shapes)
+            shapes = zip(sizes.tolist(),
+                         rng.integers(0, w_video - sizes + 1).tolist(),
+                         rng.integers(0, h_video - sizes + 1).tolist(),
+                         rng.random(num_shapes).tolist(),  # Hue
+                         rng.integers(100, 201, num_shapes).tolist(),  # Alpha
+                         rng.choice(['rect', 'circle', 'triangle'], num_shapes).tolist())
+            
             # Draw background shapes
-            for _ in range(num_shapes):
-                # Pick random properties
-                size = random.randint(20, 100)
-                x = random.randint(0, w_video - size)
-                y = random.randint(0, h_video - size)
-                
+            for size, x, y, h, alpha, shape_type in shapes:
                 # Random color with alpha
-                h = random.random()
                 s = 0.8
                 v = 0.8
                 r, g, b = [int(c * 255) for c in colorsys.hsv_to_rgb(h, s, v)]
-                alpha = random.randint(100, 200)
-                
-                # Choose shape type
-                shape_type = random.choice(['rect', 'circle', 'triangle'])
                 
                 if shape_type == 'rect':
                     draw.rectangle([x, y, x + size, y + size], fill=(r, g, b, alpha))
@@ -538,7 +533,9 @@ for effect_idx, effect in enumerate(effects):
             # Randomly sample points to create particles
             num_particles = 500
             if len(text_points) > 0:
-                sampled_points = random.sample(text_points, min(num_particles, len(text_points)))
+                rng = frame_rng(effect["effect_type"], frame_idx)
+                sampled = rng.choice(len(text_points), min(num_particles, len(text_points)), replace=False)
+                sampled_points = [text_points[i] for i in sampled.tolist()]
                 
                 # For each sampled point, draw a particle
                 for point in sampled_points:
@@ -720,75 +717,27 @@ draw.rectangle(
     fill=(0, 0, 0, 128)  # Semi-transparent black
 )
 draw.text((x, y), instructions, fill=(255, 255, 255), font=small_font)
-instructions_path = os.path.join(temp_dir, "instructions.png")
 
-# Convert to RGB for MoviePy
-bg = Image.new("RGB", instructions_img.size, (0, 0, 0))
-bg.paste(instructions_img, mask=instructions_img.split()[3])  # Use alpha channel as mask
-bg.save(instructions_path)
+# Lay the segments out on one flat frame table
+timeline = SegmentTimeline(duration, TEST_FPS, TEST_RESOLUTION)
 
-# Create video clips
-segments = []
-
-# First create all the clips
 for i in range(NUM_EFFECTS):
     effect_start = i * SEGMENT_DURATION
     
     # Add this effect segment
-    segment = {
-        'frames': effect_frames[i],
-        'start_time': effect_start,
-        'duration': SEGMENT_DURATION
-    }
-    segments.append(segment)
+    timeline.add_segment(effect_frames[i], effect_start, SEGMENT_DURATION)
     
     # Add transition after each effect (except the last one)
     if i < NUM_EFFECTS - 1:
         transition_start = effect_start + SEGMENT_DURATION - 0.5  # Half-second overlap
-        
-        # Add transition segment
-        segment = {
-            'frames': transition_frames,
-            'start_time': transition_start,
-            'duration': 0.5
-        }
-        segments.append(segment)
-
-# Create a single clip from each frame sequence
-clips = []
-background = ColorClip(size=TEST_RESOLUTION, color=(0, 0, 0), duration=duration)
-clips.append(background)
-
-# Create clips from frame sequences
-for segment in segments:
-    frames = segment['frames']
-    start_time = segment['start_time']
-    segment_duration = segment['duration']
-    
-    # Create clip from the first frame
-    segment_clip = ImageClip(frames[0]).set_duration(1/TEST_FPS)
-    
-    # Add the rest of the frames as overlays with appropriate timing
-    for j in range(1, len(frames)):
-        frame_clip = ImageClip(frames[j]).set_duration(1/TEST_FPS).set_start(j/TEST_FPS)
-        segment_clip = CompositeVideoClip([segment_clip, frame_clip])
-    
-    # Set the final duration and start time for this segment
-    segment_clip = segment_clip.set_duration(segment_duration).set_start(start_time)
-    clips.append(segment_clip)
+        timeline.add_segment(transition_frames, transition_start, 0.5)
 
 # Add instructions overlay
-instructions_clip = ImageClip(instructions_path).set_duration(duration)
-clips.append(instructions_clip)
-
-# Combine all clips and add audio
-print("Creating final video...")
-video = CompositeVideoClip(clips)
-video = video.set_audio(audio)
+timeline.add_overlay(instructions_img)
 
-# Write video
+# Write video, with the track trimmed to the demo duration
 print(f"Writing visual effects demo to {OUTPUT_PATH}...")
-video.write_videofile(OUTPUT_PATH, fps=TEST_FPS, codec='libx264', audio_codec='aac')
+timeline.write(OUTPUT_PATH, audio_path=TRACK_PATH, audio_duration=duration)
 print(f"Test complete! Please check {OUTPUT_PATH}")
 
 # Clean up
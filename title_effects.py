@@ -0,0 +1,287 @@
+import math
+from collections import OrderedDict
+import numpy as np
+from PIL import Image
+from blur import gaussian_blur
+from settings import GLOW_CACHE_BUCKETS, GLOW_CACHE_SIZE, WAVEFORM_POINTS
+
+# Title glow rendering shared by script.py and script2.py. The title raster is
+# recoloured with whole-array alpha operations instead of per-pixel getpixel/putpixel loops,
+# and the ring glow behind it is looked up from a precomputed distance field.
+
+# Ranges title_transform produces: strength 0.5-1 off the beat and 1-2 on it,
+# radius 2-7 off the beat and 5-15 on it
+GLOW_STRENGTH_RANGE = (0.5, 2.0)
+GLOW_RADIUS_RANGE = (2.0, 15.0)
+
+# Clear border to give a title raster so the widest glow fades out rather than
+# being cut off at the text's edges (the same room Layer.blur leaves)
+GLOW_PAD = int(math.ceil(3 * GLOW_RADIUS_RANGE[1])) + 2
+
+
+def title_alpha(image, mask=None):
+    # Alpha channel of a title frame. moviepy clips (TextClip included) return RGB
+    # frames and keep their alpha in a separate float mask; pass clip.mask.get_frame(t)
+    # as `mask` for those. Without a mask, frames without an alpha channel count as
+    # fully transparent, the same as the old per-pixel check `len(pixel) > 3 and pixel[3] > 0`
+    if mask is not None:
+        return np.rint(np.asarray(mask) * 255.0).astype(np.uint8)
+    image = np.asarray(image)
+    if image.ndim == 3 and image.shape[2] > 3:
+        return image[:, :, 3]
+    return np.zeros(image.shape[:2], dtype=np.uint8)
+
+
+def tint_alpha(alpha, color, strength=None, falloff=1.0):
+    # RGBA layer of `color` wherever alpha > 0, fully transparent elsewhere.
+    # With a strength the alpha becomes min(255, int(alpha * strength * falloff)),
+    # evaluated in the same order and precision as the old per-pixel code
+    layer = np.zeros(alpha.shape + (4,), dtype=np.uint8)
+    covered = alpha > 0
+    layer[covered, :3] = color
+    if strength is None:
+        layer[:, :, 3] = alpha
+    else:
+        scaled = alpha * strength * falloff
+        layer[:, :, 3] = np.where(covered, np.minimum(255, scaled.astype(np.int64)), 0)
+    return layer
+
+
+def glow_layer(alpha, color, glow_strength, glow_radius, i):
+    # Layer i of the glow: weaker and tighter than the one before, then blurred
+    falloff = 1 - i * 0.3
+    layer = Image.fromarray(tint_alpha(alpha, color, glow_strength, falloff), 'RGBA')
+    return gaussian_blur(layer, glow_radius * falloff)
+
+
+class GlowCache:
+    # Bounded LRU of blurred glow layers. Strength and radius are quantized into
+    # `buckets` levels, so frames with similar energy share the same layers.
+    name = "Glow cache"
+
+    def __init__(self, buckets=GLOW_CACHE_BUCKETS, max_layers=GLOW_CACHE_SIZE,
+                 strength_range=GLOW_STRENGTH_RANGE, radius_range=GLOW_RADIUS_RANGE):
+        self.buckets = max(2, buckets)
+        self.max_layers = max(1, max_layers)
+        self.strength_range = strength_range
+        self.radius_range = radius_range
+        self.layers = OrderedDict()
+        self.nbytes = 0
+        self.peak_nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def quantize(self, value, value_range):
+        # (bucket, bucket value) for a value, clamped to the range
+        low, high = value_range
+        step = (high - low) / (self.buckets - 1)
+        bucket = int(round((min(max(float(value), low), high) - low) / step))
+        return bucket, low + bucket * step
+
+    def key(self, title, glow_strength, glow_radius, i):
+        # (key, quantized strength, quantized radius). The title raster is part of
+        # the key, so a changed title never reuses old layers.
+        strength_bucket, strength = self.quantize(glow_strength, self.strength_range)
+        radius_bucket, radius = self.quantize(glow_radius, self.radius_range)
+        return title.key + (strength_bucket, radius_bucket, i), strength, radius
+
+    def cached(self, key, build):
+        # LRU lookup, building and storing the entry on a miss
+        entry = self.layers.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.layers.move_to_end(key)
+            return entry
+
+        self.misses += 1
+        entry = build()
+        self.layers[key] = entry
+        self.nbytes += _nbytes(entry)
+        while len(self.layers) > self.max_layers:
+            _, evicted = self.layers.popitem(last=False)
+            self.nbytes -= _nbytes(evicted)
+        self.peak_nbytes = max(self.peak_nbytes, self.nbytes)
+        return entry
+
+    def get(self, title, color, glow_strength, glow_radius, i):
+        key, strength, radius = self.key(title, glow_strength, glow_radius, i)
+        return self.cached(key + (tuple(color),), lambda: glow_layer(title.alpha, color, strength, radius, i))
+
+    def report(self):
+        lookups = self.hits + self.misses
+        hit_rate = 100.0 * self.hits / lookups if lookups else 0.0
+        print(f"{self.name}: {self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate), "
+              f"{len(self.layers)} layers held, {self.nbytes / 1e6:.1f} MB "
+              f"(peak {self.peak_nbytes / 1e6:.1f} MB, {self.buckets} buckets, limit {self.max_layers} layers)")
+
+
+class GlowMaskCache(GlowCache):
+    # Glow cache for colours that change every frame. A layer's blur doesn't depend
+    # on its colour, so only the blurred masks are cached and the colour is
+    # multiplied in per frame, which is one small array operation per layer.
+    name = "Glow mask cache"
+
+    def get(self, title, color, glow_strength, glow_radius, i):
+        key, strength, radius = self.key(title, glow_strength, glow_radius, i)
+        mask = self.cached(key, lambda: glow_mask(title.alpha, strength, radius, i))
+        return Image.fromarray(tint_mask(mask, color), 'RGBA')
+
+
+def glow_mask(alpha, glow_strength, glow_radius, i):
+    # Blurred (coverage, alpha) planes of glow layer i. PIL blurs RGBA channels
+    # independently, so a white layer's red channel is the blurred coverage that
+    # every colour channel is a multiple of.
+    layer = np.asarray(glow_layer(alpha, (255, 255, 255), glow_strength, glow_radius, i))
+    return np.ascontiguousarray(layer[:, :, [0, 3]])
+
+
+def tint_mask(mask, color):
+    # RGBA glow layer from a blurred mask: coverage scaled by the colour, alpha as is
+    layer = np.empty(mask.shape[:2] + (4,), dtype=np.uint8)
+    coverage = mask[:, :, 0].astype(np.uint32)
+    for channel, value in enumerate(color):
+        layer[:, :, channel] = (coverage * int(value) + 127) // 255
+    layer[:, :, 3] = mask[:, :, 1]
+    return layer
+
+
+def _nbytes(entry):
+    if isinstance(entry, Image.Image):
+        return entry.width * entry.height * len(entry.getbands())
+    return entry.nbytes
+
+
+class TitleRaster:
+    # The parts of a title frame that don't change while only its glow does: the
+    # alpha, its identity for the glow caches and the sharp text layer. Build it
+    # once per title rather than from every frame. For a moviepy clip pass its mask
+    # too (see title_alpha); `pad` adds a clear border on every side for the glow.
+
+    def __init__(self, image, text_color=(255, 255, 255), mask=None, pad=0):
+        self.alpha = np.pad(title_alpha(image, mask), pad) if pad else title_alpha(image, mask)
+        self.size = (self.alpha.shape[1], self.alpha.shape[0])
+        self.key = (self.alpha.shape, hash(self.alpha.tobytes()))
+        self.text = Image.fromarray(tint_alpha(self.alpha, text_color), 'RGBA')
+
+
+def render_title_glow(image, glow_strength, glow_radius, glow_colors, text_color=(255, 255, 255), cache=None):
+    # Blurred glow layers (one per colour, each weaker and tighter than the last)
+    # under the sharp text. Returns an RGBA PIL image the size of the title.
+    # `image` is a title frame or a TitleRaster (whose own text colour is used).
+    # With a GlowCache (or GlowMaskCache) the layers come from quantized, pre-blurred copies.
+    title = image if isinstance(image, TitleRaster) else TitleRaster(image, text_color)
+    result = Image.new('RGBA', title.size, (0, 0, 0, 0))
+    for i, color in enumerate(glow_colors):
+        if cache is not None:
+            layer = cache.get(title, color, glow_strength, glow_radius, i)
+        else:
+            layer = glow_layer(title.alpha, color, glow_strength, glow_radius, i)
+        result = Image.alpha_composite(result, layer)
+    return Image.alpha_composite(result, title.text)
+
+
+class RadialGlow:
+    # Concentric-ring glow behind the title. The distance of every output pixel
+    # from the centre is computed once; each frame builds a small table of whole
+    # RGBA pixels (the glow colour with the rings' alpha) by distance and looks the
+    # square around the rings up in it, one 32-bit pixel per lookup, instead of
+    # drawing hundreds of ellipse outlines.
+    ring_spacing = 20  # a ring every 20 pixels, like range(radius, 0, -20)
+    ring_width = 10    # each ring 10 pixels wide (the old outline width)
+
+    def __init__(self, size, center=None):
+        width, height = size
+        self.center = center if center is not None else (width // 2, height // 2)
+        yy, xx = np.ogrid[:height, :width]
+        self.size = size
+        self.distance = np.floor(np.hypot(xx - self.center[0], yy - self.center[1])).astype(np.uint16)
+        self.radii = np.arange(int(self.distance.max()) + 1)
+        self.frame = None
+        self.region = (slice(0, 0), slice(0, 0))
+
+    def profile(self, glow_radius, energy_factor):
+        # Alpha (0-255) for every whole-pixel distance from the centre. Three layers,
+        # each smaller and fainter than the last, composited over each other; within a
+        # layer a ring's alpha scales with its radius, as the ellipse outlines did
+        coverage = np.zeros(len(self.radii))
+        for i in range(3):
+            current_radius = glow_radius * (1 - i * 0.3)
+            alpha = int(100 * (1 - i * 0.3) * energy_factor)
+            outer = int(current_radius)
+            if alpha <= 0 or outer <= 0:
+                continue
+            inward = outer - self.radii
+            ring_radius = outer - (inward // self.ring_spacing) * self.ring_spacing
+            in_ring = (inward >= 0) & (inward % self.ring_spacing < self.ring_width) & (ring_radius > 0)
+            layer = np.where(in_ring, np.floor(alpha * (ring_radius / current_radius)), 0.0) / 255.0
+            coverage = layer + coverage * (1.0 - layer)
+        return np.round(coverage * 255).astype(np.uint8)
+
+    def render(self, glow_radius, energy_factor, color):
+        # RGBA frame, transparent except for the square around the rings, where the
+        # glow colour gets its alpha from the distance table. The frame buffer is
+        # reused: only the previous square is cleared, and the result is only valid
+        # until the next call.
+        width, height = self.size
+        if self.frame is None:
+            self.frame = np.zeros((height, width, 4), dtype=np.uint8)
+            self.pixels = self.frame.view(np.uint32)[:, :, 0]
+        self.pixels[self.region] = 0
+        outer = int(glow_radius) + 1
+        self.region = (slice(max(self.center[1] - outer, 0), min(self.center[1] + outer + 1, height)),
+                       slice(max(self.center[0] - outer, 0), min(self.center[0] + outer + 1, width)))
+        table = np.zeros((len(self.radii), 4), dtype=np.uint8)
+        table[:, :3] = color
+        table[:, 3] = self.profile(glow_radius, energy_factor)
+        np.take(table.view(np.uint32)[:, 0], self.distance[self.region], out=self.pixels[self.region], mode="clip")
+        return self.frame
+
+
+class WaveformLine:
+    # The waveform lines above and below the title. Each frame takes a strided view
+    # of the 100 ms window around t and writes the line coordinates into buffers
+    # allocated once, so the number of points doesn't add any per-point Python work.
+
+    def __init__(self, samples, sr, n_points=WAVEFORM_POINTS, window_duration=0.1):
+        self.samples = samples
+        self.sr = sr
+        self.n_points = max(2, n_points)
+        self.window_duration = window_duration
+        self.positions = np.arange(self.n_points, dtype=np.float64)
+        self.x = np.empty(self.n_points)
+        self.offsets = np.empty(self.n_points)
+        self.above = np.empty((self.n_points, 2))
+        self.below = np.empty((self.n_points, 2))
+
+    def lines(self, t, left, width, top, bottom, scale):
+        # (above, below) flat [x0, y0, x1, y1, ...] lists spanning `width` pixels from `left`,
+        # the samples normalised to +/-scale pixels around `top` and `bottom`; None
+        # when the window is silent. Plain lists because PIL draws them several
+        # times faster than it reads NumPy arrays.
+        start_sample = max(0, int((t - self.window_duration / 2) * self.sr))
+        end_sample = min(int((t + self.window_duration / 2) * self.sr), len(self.samples))
+        if start_sample >= end_sample:
+            return None, None
+        segment = self.samples[start_sample:end_sample]
+        max_val = max(float(segment.max()), -float(segment.min()))
+        if max_val <= 0:
+            return None, None
+
+        # Every step-th sample, up to n_points of them
+        n_points = min(len(segment), self.n_points)
+        if n_points < 2:
+            return None, None
+        step = len(segment) // n_points if len(segment) > n_points else 1
+        window = segment[::step][:n_points]
+
+        x, offsets = self.x[:n_points], self.offsets[:n_points]
+        np.multiply(self.positions[:n_points], width * step / len(segment), out=x)
+        x += left
+        np.multiply(window, scale / max_val, out=offsets)
+        above, below = self.above[:n_points], self.below[:n_points]
+        above[:, 0] = x
+        np.add(top, offsets, out=above[:, 1])
+        below[:, 0] = x
+        np.subtract(bottom, offsets, out=below[:, 1])
+        return above.ravel().tolist(), below.ravel().tolist()
+
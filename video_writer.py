@@ -0,0 +1,90 @@
+import os
+import subprocess
+import tempfile
+import numpy as np
+from moviepy.config import get_setting
+
+# Streams rendered frames straight into an ffmpeg encoder over a pipe: raw RGB in,
+# encoded video out, with the soundtrack muxed in the same pass. Nothing touches
+# the disk but the output file, and memory stays at a frame or two plus the pipe
+# buffer, because writes block while the encoder catches up.
+# Encoder settings follow moviepy's write_videofile defaults.
+
+
+class FrameWriter:
+
+    def __init__(self, path, size, fps, codec="libx264", preset="medium", audio_path=None,
+                 audio_duration=None, audio_codec="aac", ffmpeg_params=None):
+        # size is (width, height); audio_path is any file ffmpeg can read, trimmed to
+        # audio_duration seconds when given
+        self.path = path
+        self.size = (int(size[0]), int(size[1]))
+        self.frames = 0
+        cmd = [get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error",
+               "-f", "rawvideo", "-vcodec", "rawvideo", "-s", "%dx%d" % self.size,
+               "-pix_fmt", "rgb24", "-r", "%.02f" % fps, "-i", "-"]
+        if audio_path is not None:
+            if audio_duration is not None:
+                cmd.extend(["-t", "%.3f" % audio_duration])
+            cmd.extend(["-i", audio_path, "-map", "0:v", "-map", "1:a", "-acodec", audio_codec])
+        else:
+            cmd.append("-an")
+        cmd.extend(["-vcodec", codec, "-preset", preset])
+        if codec == "libx264" and self.size[0] % 2 == 0 and self.size[1] % 2 == 0:
+            cmd.extend(["-pix_fmt", "yuv420p"])
+        cmd.extend(ffmpeg_params or [])
+        cmd.append(path)
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    def write(self, frame):
+        # frame: PIL image or uint8 array of the writer's size (RGBA is written as RGB)
+        if not isinstance(frame, np.ndarray):
+            frame = np.asarray(frame.convert("RGB") if frame.mode != "RGB" else frame)
+        if frame.shape[1] != self.size[0] or frame.shape[0] != self.size[1]:
+            raise ValueError(f"Frame is {frame.shape[1]}x{frame.shape[0]}, expected {self.size[0]}x{self.size[1]}")
+        try:
+            self.proc.stdin.write(np.ascontiguousarray(frame[:, :, :3], dtype=np.uint8).data)
+        except BrokenPipeError:
+            self.close()
+            raise
+        self.frames += 1
+
+    def close(self):
+        # Finish encoding; raises if ffmpeg failed
+        if self.proc.stdin and not self.proc.stdin.closed:
+            try:
+                self.proc.stdin.close()
+            except BrokenPipeError:
+                pass
+        error = self.proc.stderr.read().decode(errors="replace")
+        if self.proc.wait() != 0:
+            raise IOError(f"ffmpeg failed writing {self.path}:\n{error}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def concat_videos(paths, output, audio_path=None, audio_duration=None, audio_codec="aac"):
+    # Join videos encoded with the same settings into one file without re-encoding
+    # (ffmpeg's concat demuxer), muxing in the soundtrack as FrameWriter would
+    fd, list_path = tempfile.mkstemp(suffix=".txt")
+    try:
+        with os.fdopen(fd, "w") as f:
+            for path in paths:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        cmd = [get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error",
+               "-f", "concat", "-safe", "0", "-i", list_path]
+        if audio_path is not None:
+            if audio_duration is not None:
+                cmd.extend(["-t", "%.3f" % audio_duration])
+            cmd.extend(["-i", audio_path, "-map", "0:v", "-map", "1:a", "-acodec", audio_codec])
+        cmd.extend(["-vcodec", "copy", output])
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise IOError(f"ffmpeg failed joining {output}:\n{result.stderr.decode(errors='replace')}")
+    finally:
+        os.remove(list_path)
@@ -1,15 +1,19 @@
 import os
 from dotenv import load_dotenv
 import numpy as np
-from moviepy.editor import AudioFileClip, ImageClip, ColorClip, CompositeVideoClip
-from PIL import Image, ImageDraw, ImageFont, ImageFilter, ImageEnhance, ImageChops
+from PIL import Image, ImageDraw, ImageFont, ImageEnhance, ImageChops
 import moviepy.config as mpconf
-import tempfile
 import math
 import colorsys
-import random
 import time
 from datetime import datetime
+from audio_ingest import ingest_audio
+from audio_analysis import FeatureTimeline, get_analysis_profile
+from blur import gaussian_blur
+from layers import Layer
+from video_writer import FrameWriter
+from frame_pool import RENDER_SEGMENTS, RENDER_WORKERS, render_frames, write_segmented
+from frame_random import frame_rng
 
 # Set ImageMagick path (adjust if needed)
 mpconf.change_settings({"IMAGEMAGICK_BINARY": "/opt/homebrew/bin/convert"})
@@ -31,24 +35,25 @@ FULL_SONG = True  # Set to True to process the entire song
 print(f"Creating AWESOME VISUALIZER video for \"{TITLE}\"")
 print(f"Output will be saved to: {OUTPUT_PATH}")
 
-# Create temporary directory
-temp_dir = tempfile.mkdtemp()
-print(f"Created temporary directory: {temp_dir}")
-
 # Load audio
 start_time = time.time()
-full_audio = AudioFileClip(TRACK_PATH)
+ingest = ingest_audio(TRACK_PATH, **get_analysis_profile())  # ANALYSIS_PROFILE=fast for quicker drafts
 
 if FULL_SONG:
-    audio = full_audio
-    duration = full_audio.duration
+    duration = ingest["duration"]
     print(f"Processing entire song: {duration:.2f} seconds")
 else:
     # Just use 60 seconds for testing
-    duration = min(60, full_audio.duration)
-    audio = full_audio.subclip(0, duration)
+    duration = min(60, ingest["duration"])
     print(f"Processing first {duration:.2f} seconds of song")
 
+# Resample the audio analysis onto the frame grid once: per-frame energy, beats and
+# a frames x bands matrix for the spectrum bars. Each frame just reads its row.
+timeline = FeatureTimeline(ingest["analysis"], duration, fps=FPS)
+audio_volume = np.clip(0.7 * timeline.energy_factor + 0.3 * timeline.beat_pulse, 0.0, 1.0)
+print(f"Analysed audio: {float(ingest['analysis']['tempo']):.2f} BPM, "
+      f"{timeline.band_energy.shape[1]} frequency bands")
+
 # Video dimensions - 16:9 aspect ratio
 W, H = 1280, 720
 
@@ -155,14 +160,11 @@ print(f"Created timing plan with {len(timing)} segments")
 
 # Generate frames
 total_frames = int(duration * FPS)
-frames_paths = []
 
-print(f"Generating {total_frames} frames...")
 
-for frame_idx in range(total_frames):
-    if frame_idx % 100 == 0:
-        print(f"Processing frame {frame_idx}/{total_frames} ({frame_idx/total_frames*100:.1f}%)")
-    
+# Each frame depends only on its index and the static setup above, so frames can
+# be rendered in any order, on any number of worker processes
+def render_frame(frame_idx):
     t = frame_idx / FPS  # Current time in seconds
     
     # Find current active style(s)
@@ -193,18 +195,9 @@ for frame_idx in range(total_frames):
         bg_copy = enhancer.enhance(0.3)  # Darker to make effects stand out
         img.paste(bg_copy, (0, 0), bg_copy.split()[3] if len(bg_copy.split()) > 3 else None)
     
-    # Simulate audio volume with multiple waves for more dynamic response
-    beat_freq_1 = 1.2  # Primary beat
-    beat_freq_2 = 2.4  # Double-time
-    beat_freq_3 = 0.6  # Half-time
-    
-    vol_1 = 0.5 + 0.5 * math.sin(t * 2 * math.pi * beat_freq_1)
-    vol_2 = 0.5 + 0.5 * math.sin(t * 2 * math.pi * beat_freq_2)
-    vol_3 = 0.5 + 0.5 * math.sin(t * 2 * math.pi * beat_freq_3)
-    
-    # Weight volumes to create more interesting patterns
-    # Main beat gets highest weight, but all contribute
-    simulated_volume = 0.6 * vol_1 + 0.25 * vol_2 + 0.15 * vol_3
+    # Audio volume for this frame (energy plus a kick on each beat) and the band levels
+    volume = float(audio_volume[frame_idx])
+    band_row = timeline.band_energy[frame_idx]
     
     # Apply each active style with blending
     for style_info in active_styles:
@@ -229,7 +222,7 @@ for frame_idx in range(total_frames):
                 
                 # Base radius grows over time and pulses with audio
                 base_radius = 50 + 250 * ring_factor
-                pulse_amount = 30 * simulated_volume * (1 - ring_factor * 0.5)
+                pulse_amount = 30 * volume * (1 - ring_factor * 0.5)
                 
                 # Add time-based movement
                 time_offset = t * (1 + ring_factor)
@@ -253,21 +246,21 @@ for frame_idx in range(total_frames):
                     r, g, b = [int(c * 255) for c in colorsys.hsv_to_rgb(hue, sat, val)]
                     
                     # Particle size varies with audio
-                    size = int(2 + 4 * simulated_volume)
+                    size = int(2 + 4 * volume)
                     
                     # Particle alpha also varies with audio and ring
-                    alpha = int((150 + 100 * simulated_volume) * (1 - ring_factor * 0.3))
+                    alpha = int((150 + 100 * volume) * (1 - ring_factor * 0.3))
                     
                     # Draw particle
                     style_draw.ellipse([x-size, y-size, x+size, y+size], 
                                      fill=(r, g, b, alpha))
             
             # Add text in center
-            font_size = int(70 + 20 * simulated_volume)
+            font_size = int(70 + 20 * volume)
             font = ImageFont.truetype(main_font, font_size) if main_font else ImageFont.load_default()
             
             # Text color pulses with audio
-            brightness = int(200 + 55 * simulated_volume)
+            brightness = int(200 + 55 * volume)
             text_color = (brightness, brightness, brightness, 255)
             
             # Use the correct title here - using TITLE variable
@@ -283,11 +276,8 @@ for frame_idx in range(total_frames):
             y = (H - text_height) // 2
             
             # Add glow effect on text
-            glow_layer = Image.new("RGBA", (W, H), (0, 0, 0, 0))
-            glow_draw = ImageDraw.Draw(glow_layer)
-            glow_draw.text((x, y), text, fill=(text_color[0], text_color[1], text_color[2], 100), font=font)
-            glow = glow_layer.filter(ImageFilter.GaussianBlur(10))
-            style_img = Image.alpha_composite(style_img, glow)
+            glow_layer = Layer.text((x, y), text, fill=(text_color[0], text_color[1], text_color[2], 100), font=font)
+            glow_layer.blur(10).composite_onto(style_img)
             
             # Draw main text
             style_draw.text((x, y), text, fill=text_color, font=font)
@@ -301,20 +291,14 @@ for frame_idx in range(total_frames):
             bar_width = W // num_bars
             max_height = H * 0.6
             
+            # Map bars onto the analysed frequency bands (low to high, left to right)
+            bar_levels = band_row[np.arange(num_bars) * len(band_row) // num_bars]
+            
             for i in range(num_bars):
                 bar_factor = i / num_bars
                 
-                # Calculate bar height with multiple waves for complexity
-                # This creates a mix of frequencies for a more organic look
-                bar_volume = (
-                    math.sin((bar_factor * 6 + t) * math.pi * 2) * 0.4 +
-                    math.sin((bar_factor * 3 - t * 1.5) * math.pi * 2) * 0.3 +
-                    math.sin((bar_factor * 9 + t * 0.7) * math.pi * 2) * 0.2 +
-                    math.sin((0.5 - bar_factor) * math.pi * 4) * 0.1
-                )
-                
-                # Apply audio reactivity
-                bar_height = int(abs(bar_volume) * max_height * (0.3 + 0.7 * simulated_volume))
+                # Bar height follows the energy in this bar's frequency band
+                bar_height = int(bar_levels[i] * max_height)
                 
                 # Calculate color (spectrum from blue to purple to red)
                 hue = (bar_factor + t * 0.05) % 1.0
@@ -332,7 +316,7 @@ for frame_idx in range(total_frames):
                 style_draw.rectangle([x1, y1, x2, y2], fill=(r, g, b, 180))
                 
                 # Add a glow point at top of bar
-                glow_size = int(4 + 4 * simulated_volume)
+                glow_size = int(4 + 4 * volume)
                 glow_center_x = x1 + bar_width // 2
                 glow_center_y = y1
                 
@@ -359,13 +343,13 @@ for frame_idx in range(total_frames):
             y = H // 6
             
             # Draw shadow
-            shadow_offset = int(4 + 2 * simulated_volume)
+            shadow_offset = int(4 + 2 * volume)
             style_draw.text((x + shadow_offset, y + shadow_offset), 
                           text, fill=(0, 0, 0, 180), font=font)
             
             # Draw text with vertical oscillation based on audio
             # REMOVED y_offset to keep title centered
-            # y_offset = int(10 * simulated_volume * math.sin(t * 4))
+            # y_offset = int(10 * volume * math.sin(t * 4))
             # style_draw.text((x, y + y_offset), text, fill=(255, 255, 255, 230), font=font)
             
             # Keep title centered - no y_offset
@@ -379,8 +363,8 @@ for frame_idx in range(total_frames):
             center_x, center_y = W // 2, H // 2
             
             # Number of shapes affected by audio
-            num_shapes = int(30 + 50 * simulated_volume)
-            max_size = int(180 + 100 * simulated_volume)
+            num_shapes = int(30 + 50 * volume)
+            max_size = int(180 + 100 * volume)
             
             # Layer multiple geometric patterns
             for layer in range(3):
@@ -403,7 +387,7 @@ for frame_idx in range(total_frames):
                     y = center_y + distance * math.sin(angle)
                     
                     # Size decreases as we move outward
-                    size = int(max_size * (0.1 + 0.2 * (1 - shape_factor)) * (0.5 + 0.5 * simulated_volume))
+                    size = int(max_size * (0.1 + 0.2 * (1 - shape_factor)) * (0.5 + 0.5 * volume))
                     
                     # Color cycles over time and by position
                     hue = (shape_factor + t * 0.1 + layer_factor * 0.3) % 1.0
@@ -442,7 +426,7 @@ for frame_idx in range(total_frames):
                         style_draw.polygon(corners, fill=(r, g, b, alpha))
             
             # Add title with scaling effect - using correct title
-            scale_factor = 1.0 + 0.2 * simulated_volume
+            scale_factor = 1.0 + 0.2 * volume
             font_size = int(70 * scale_factor)
             font = ImageFont.truetype(main_font, font_size) if main_font else ImageFont.load_default()
             
@@ -494,6 +478,9 @@ for frame_idx in range(total_frames):
             num_clusters = 5
             particles_per_cluster = 300
             
+            # Random stream of this frame alone, so frames render the same in any order
+            rng = frame_rng(style_name, frame_idx)
+            
             for cluster in range(num_clusters):
                 cluster_factor = cluster / (num_clusters - 1)
                 
@@ -504,12 +491,13 @@ for frame_idx in range(total_frames):
                 cluster_x = W // 2 + cluster_radius * math.cos(cluster_angle)
                 cluster_y = H // 2 + cluster_radius * math.sin(cluster_angle)
                 
+                # Particles stay close to cluster center, with some randomness
+                p_radii = (rng.uniform(0, 150, particles_per_cluster) * (0.5 + 0.5 * volume)).tolist()
+                
                 # Create particles for this cluster
                 for p in range(particles_per_cluster):
                     p_factor = p / particles_per_cluster
-                    
-                    # Particle stays close to cluster center, with some randomness
-                    p_radius = random.uniform(0, 150) * (0.5 + 0.5 * simulated_volume)
+                    p_radius = p_radii[p]
                     p_angle = p_factor * math.pi * 2 + t * (1 - cluster_factor)
                     
                     x = cluster_x + p_radius * math.cos(p_angle)
@@ -526,15 +514,15 @@ for frame_idx in range(total_frames):
                     r, g, b = [int(c * 255) for c in colorsys.hsv_to_rgb(h, s, v)]
                     
                     # Size and alpha affected by audio
-                    size = int(2 + 6 * simulated_volume * (1 - p_factor * 0.5))
-                    alpha = int(100 + 100 * simulated_volume * (1 - p_factor * 0.7))
+                    size = int(2 + 6 * volume * (1 - p_factor * 0.5))
+                    alpha = int(100 + 100 * volume * (1 - p_factor * 0.7))
                     
                     # Draw particle as a soft glow
                     color_draw.ellipse([x-size, y-size, x+size, y+size], 
                                      fill=(r, g, b, alpha))
             
             # Apply blur to create a soft, cloudy effect
-            color_layer = color_layer.filter(ImageFilter.GaussianBlur(5))
+            color_layer = gaussian_blur(color_layer, 5)
             
             # Composite color layer onto style image
             style_img = Image.alpha_composite(style_img, color_layer)
@@ -568,8 +556,8 @@ for frame_idx in range(total_frames):
             #     alpha = int(255 * trail_factor)
             #     
             #     # Position shifts based on time and audio
-            #     x_offset = int(20 * (1 - trail_factor) * math.sin(t * 3) * simulated_volume)
-            #     y_offset = int(10 * (1 - trail_factor) * math.cos(t * 5) * simulated_volume)
+            #     x_offset = int(20 * (1 - trail_factor) * math.sin(t * 3) * volume)
+            #     y_offset = int(10 * (1 - trail_factor) * math.cos(t * 5) * volume)
             #     
             #     x = base_x + x_offset
             #     y = base_y + y_offset
@@ -618,7 +606,7 @@ for frame_idx in range(total_frames):
                     z = 0.5 * math.sin(x * 3 + t) * math.cos(y * 3 + t * 0.7)
                     
                     # Audio affects the wave height
-                    z *= (0.5 + 1.0 * simulated_volume)
+                    z *= (0.5 + 1.0 * volume)
                     
                     # Apply 3D rotations (simplified)
                     # Rotate around X axis
@@ -665,7 +653,7 @@ for frame_idx in range(total_frames):
                 r, g, b = [int(c * 255) for c in colorsys.hsv_to_rgb(h, s, v)]
                 
                 # Point size varies with audio
-                size = int(2 + 3 * simulated_volume)
+                size = int(2 + 3 * volume)
                 
                 # Draw the point
                 style_draw.ellipse([p['x']-size, p['y']-size, p['x']+size, p['y']+size], 
@@ -696,7 +684,7 @@ for frame_idx in range(total_frames):
                             break
             
             # Add title at center with dynamic scale - using correct title (TITLE)
-            scale_factor = 1.0 + 0.15 * math.sin(t * 2) * simulated_volume
+            scale_factor = 1.0 + 0.15 * math.sin(t * 2) * volume
             font_size = int(80 * scale_factor)
             font = ImageFont.truetype(main_font, font_size) if main_font else ImageFont.load_default()
             
@@ -718,13 +706,9 @@ for frame_idx in range(total_frames):
             # y_offset = int(10 * math.sin(angle_x * 2))
             
             # Draw text with glow
-            glow_layer = Image.new("RGBA", (W, H), (0, 0, 0, 0))
-            glow_draw = ImageDraw.Draw(glow_layer)
-            
             # Keep title centered - no offsets
-            glow_draw.text((x, y), text, fill=(200, 200, 255, 100), font=font)
-            glow = glow_layer.filter(ImageFilter.GaussianBlur(10))
-            style_img = Image.alpha_composite(style_img, glow)
+            glow_layer = Layer.text((x, y), text, fill=(200, 200, 255, 100), font=font)
+            glow_layer.blur(10).composite_onto(style_img)
             
             # Main text - perfectly centered
             style_draw.text((x, y), text, fill=(255, 255, 255, 220), font=font)
@@ -780,46 +764,38 @@ for frame_idx in range(total_frames):
                   fill=(0, 0, 0, 150))
     draw.text((time_x, time_y), time_text, fill=(255, 255, 255), font=small_font)
     
-    # Convert to RGB for MoviePy
+    # Convert to RGB for the encoder
     if img.mode == 'RGBA':
         bg = Image.new("RGB", img.size, (0, 0, 0))
         bg.paste(img, mask=img.split()[3])  # Use alpha channel as mask
         img = bg
     
-    # Save frame
-    frame_path = os.path.join(temp_dir, f"frame_{frame_idx:05d}.jpg")
-    img.save(frame_path, quality=95)
-    frames_paths.append(frame_path)
+    return img
 
-# Create video from frames
-print("Creating video from frames...")
-clips = []
 
-# Create background clip
-background = ColorClip(size=(W, H), color=(0, 0, 0), duration=duration)
-clips.append(background)
+if RENDER_SEGMENTS > 1:
+    # Time ranges rendered and encoded in parallel, joined without re-encoding and
+    # with the track muxed in once at the end
+    print(f"Generating {total_frames} frames...")
+    write_segmented(render_frame, total_frames, OUTPUT_PATH, (W, H), FPS,
+                    audio_path=TRACK_PATH, audio_duration=duration)
+else:
+    # Frames go straight to the encoder in order as they're rendered, with the track
+    # (trimmed to the rendered duration) muxed in the same pass
+    writer = FrameWriter(OUTPUT_PATH, (W, H), FPS, audio_path=TRACK_PATH, audio_duration=duration)
 
-# Add frames as clip
-for i, frame_path in enumerate(frames_paths):
-    frame_clip = ImageClip(frame_path).set_duration(1/FPS).set_start(i/FPS)
-    clips.append(frame_clip)
+    workers = min(RENDER_WORKERS, total_frames)
+    print(f"Generating {total_frames} frames with {workers} worker{'s' if workers != 1 else ''}...")
 
-# Combine all clips and add audio
-print("Compositing final video...")
-video = CompositeVideoClip(clips)
-video = video.set_audio(audio)
+    for frame_idx, frame in enumerate(render_frames(render_frame, total_frames, workers)):
+        if frame_idx % 100 == 0:
+            print(f"Processing frame {frame_idx}/{total_frames} ({frame_idx/total_frames*100:.1f}%)")
+        writer.write(frame)
 
-# Write video
-print(f"Writing final video to {OUTPUT_PATH}...")
-video.write_videofile(OUTPUT_PATH, fps=FPS, codec='libx264', audio_codec='aac')
+    # Finish encoding
+    print(f"Finishing video {OUTPUT_PATH}...")
+    writer.close()
 
 print(f"Visualizer complete! Total time: {time.time() - start_time:.1f} seconds")
 print(f"Output saved to: {OUTPUT_PATH}")
 
-# Clean up
-import shutil
-try:
-    shutil.rmtree(temp_dir)
-    print(f"Removed temporary directory {temp_dir}")
-except Exception as e:
-    print(f"Could not remove temporary directory: {e}")
\ No newline at end of file